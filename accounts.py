@@ -0,0 +1,227 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import change_queue
+import metrics
+from utils import get_accounts, get_all_domains, load_domain_state, update_domain_state, get_confirmed_value, \
+    record_domain_results, load_pending_changes, record_ip_change
+
+
+CGROUP_MEMORY_FILES = [
+    ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+    ('/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes'),
+]
+# cgroup v1 без ограничения отдает число около 2**63
+CGROUP_UNLIMITED_BYTES = 2 ** 60
+# Оценка памяти на браузер, когда предел browser_memory_limit_mb выключен
+UNLIMITED_BROWSER_MEMORY_MB = 400
+
+
+def _cgroup_available_memory_mb():
+    for limit_file, usage_file in CGROUP_MEMORY_FILES:
+        try:
+            with open(limit_file, 'r') as f:
+                limit = f.read().strip()
+            with open(usage_file, 'r') as f:
+                usage = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if limit == 'max' or not limit.isdigit() or int(limit) >= CGROUP_UNLIMITED_BYTES:
+            return None
+        return max(0, int(limit) - usage) // (1024 * 1024)
+    return None
+
+
+def _available_memory_mb():
+    host = None
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    host = int(line.split()[1]) // 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    # В Docker /proc/meminfo показывает память хоста, ограничение контейнера задает cgroup
+    container = _cgroup_available_memory_mb()
+    if container is None:
+        return host
+    return container if host is None else min(host, container)
+
+
+def max_parallel_browsers(config, accounts_count):
+    limit = max(1, min(config.get("max_parallel_browsers", 2), accounts_count))
+    available = _available_memory_mb()
+    # Сторож позволяет браузеру дорасти до browser_memory_limit_mb, столько и резервируем на каждый
+    per_browser = config.get("browser_memory_limit_mb", 1024) or UNLIMITED_BROWSER_MEMORY_MB
+    if available is not None:
+        limit = min(limit, max(1, available // per_browser))
+    return limit
+
+
+def _get_session(sessions, account):
+    from dns_updater import BrowserSession
+
+    if sessions is None:
+        return None
+    name = account.get("account")
+    if name not in sessions:
+        sessions[name] = BrowserSession(account)
+    return sessions[name]
+
+
+def _run_for_accounts(config, accounts, func):
+    if len(accounts) == 1:
+        return [func(accounts[0])]
+
+    workers = max_parallel_browsers(config, len(accounts))
+    print(f"ℹ️  Аккаунтов: {len(accounts)}, одновременно браузеров: {workers}.")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="account") as executor:
+        return list(executor.map(func, accounts))
+
+
+def update_accounts(config, changes, sessions=None):
+    from dns_updater import update_dns_records
+
+    def update_account(account):
+        started = time.monotonic()
+        try:
+            account_changes = {fqdn: changes[fqdn] for fqdn in account["domains"]}
+            results = update_dns_records(account, account_changes, session=_get_session(sessions, account))
+        except Exception as e:
+            print(f"  - ❌ Аккаунт {account.get('account') or account['timeweb_login']}: {e}")
+            results = dict.fromkeys(account["domains"], False)
+        return account, results, time.monotonic() - started
+
+    accounts = [dict(account, domains=[fqdn for fqdn in account["domains"] if fqdn in changes])
+                for account in get_accounts(config)]
+    accounts = [account for account in accounts if account["domains"]]
+    combined = {}
+    summary = _run_for_accounts(config, accounts, update_account)
+    for account, results, duration in summary:
+        combined.update(results)
+
+    if len(summary) > 1:
+        print("\n--- Итог по аккаунтам ---")
+        for account, results, duration in summary:
+            ok = sum(1 for success in results.values() if success)
+            print(f"  {account.get('account')}: обновлено {ok} из {len(results)} за {duration:.1f} с")
+    return combined
+
+
+def get_accounts_records(config, accounts, sessions=None):
+    from dns_updater import get_dns_records
+
+    def read_account(account):
+        return get_dns_records(account, session=_get_session(sessions, account))
+
+    combined = {}
+    for records in _run_for_accounts(config, accounts, read_account):
+        if records is None:
+            return None
+        combined.update(records)
+    return combined
+
+
+def pending_domains(domains, state, current_ip, force=False):
+    if force:
+        return list(domains)
+    return [fqdn for fqdn in domains if get_confirmed_value(state, fqdn) != current_ip]
+
+
+def apply_ip(config, current_ip, domains=None, force=False, sessions=None, debounce_seconds=0):
+    all_domains = get_all_domains(config)
+    scope = all_domains if domains is None else domains
+    state = load_domain_state(all_domains)
+    pending = pending_domains(scope, state, current_ip, force)
+    # Запись вернулась к подтвержденному значению: отложенное изменение больше не нужно
+    for fqdn in change_queue.discard([fqdn for fqdn in scope if fqdn not in pending]):
+        print(f"ℹ️  {fqdn}: IP вернулся к {current_ip}, отложенное изменение отменено.")
+
+    for fqdn in pending:
+        entry = state.get(fqdn, {})
+        saved_value = entry.get("value") or "не найден"
+        if entry.get("failures"):
+            print(f"🔁 {fqdn}: повтор после {entry['failures']} неудачн. попыток (подтвержден: {saved_value})")
+        elif saved_value == current_ip:
+            print(f"ℹ️  {fqdn}: IP не изменился, но обновление будет выполнено принудительно.")
+        else:
+            print(f"⚠️ {fqdn}: IP-адрес изменился! Старый: {saved_value}, Новый: {current_ip}")
+
+    if pending and not force and config.get("dns_precheck", True):
+        unpublished = _skip_published(config, pending, current_ip)
+        change_queue.discard([fqdn for fqdn in pending if fqdn not in unpublished])
+        pending = unpublished
+
+    change_queue.enqueue(dict.fromkeys(pending, current_ip))
+    return flush_changes(config, sessions=sessions, debounce_seconds=debounce_seconds)
+
+
+def flush_changes(config, sessions=None, debounce_seconds=0):
+    all_domains = get_all_domains(config)
+    change_queue.discard([fqdn for fqdn in load_pending_changes() if fqdn not in all_domains])
+    due = change_queue.due_changes(debounce_seconds)
+    if not due:
+        waiting = change_queue.next_due_in(debounce_seconds)
+        if waiting is not None:
+            print(f"ℹ️  Изменения ждут в очереди, будут применены через {waiting:.0f} с.")
+        return {}
+
+    changes = {fqdn: entry["value"] for fqdn, entry in due.items()}
+    print(f"Начинаю обновление DNS записей ({len(changes)} из {len(all_domains)}, "
+          f"это может занять несколько минут)...")
+    started_at = time.time()
+    with metrics.phase("update_cycle"):
+        results = update_accounts(config, changes, sessions=sessions)
+    duration = time.time() - started_at
+
+    def record(state):
+        for fqdn, ok in results.items():
+            record_domain_results(state, {fqdn: ok}, changes[fqdn])
+
+    update_domain_state(record)
+    change_queue.complete(due, results)
+    for value in set(changes.values()):
+        outcomes = [results.get(fqdn, False) for fqdn, fqdn_value in changes.items() if fqdn_value == value]
+        record_ip_change(value, started_at, duration, outcomes.count(True), outcomes.count(False))
+
+    updated = [fqdn for fqdn, ok in results.items() if ok]
+    if updated:
+        from dns_check import forget
+        forget(updated)
+    if updated and config.get("dns_verify_propagation", False):
+        _verify_propagation(config, {fqdn: changes[fqdn] for fqdn in updated})
+    return results
+
+
+def _verify_propagation(config, changes):
+    from dns_check import verify_propagation
+
+    timeout = config.get("dns_propagation_timeout_seconds", 120)
+    lagging = []
+    for value in sorted(set(changes.values())):
+        fqdns = [fqdn for fqdn, fqdn_value in changes.items() if fqdn_value == value]
+        print(f"ℹ️  Жду появления {value} на всех NS-серверах (до {timeout} с)...")
+        propagated = verify_propagation(config, fqdns, value, timeout=timeout)
+        lagging.extend(fqdn for fqdn, ok in propagated.items() if not ok)
+    if lagging:
+        print(f"🟡 Новое значение еще не видно на всех NS-серверах: {', '.join(lagging)}")
+    else:
+        print("✅ Новое значение видно на всех NS-серверах.")
+
+
+def _skip_published(config, pending, current_ip):
+    from dns_check import resolve_records
+
+    published = [fqdn for fqdn, values in resolve_records(config, pending).items() if values == [current_ip]]
+    if not published:
+        return pending
+    for fqdn in published:
+        print(f"ℹ️  {fqdn}: на NS-серверах уже {current_ip}, панель не трогаю.")
+    update_domain_state(lambda state: record_domain_results(state, dict.fromkeys(published, True), current_ip))
+    return [fqdn for fqdn in pending if fqdn not in published]
+
+
+def close_sessions(sessions):
+    for session in (sessions or {}).values():
+        session.close()
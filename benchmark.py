@@ -0,0 +1,256 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from utils import DATA_DIR, load_config, save_cookies, delete_cookies
+
+BENCHMARKS_FILE = os.path.join(DATA_DIR, 'benchmarks.jsonl')
+BENCH_ACCOUNT = "benchmark"
+BENCH_NEW_IP = "198.51.100.7"
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def bench_drivers(rounds=3):
+    rounds = int(rounds)
+    from drivers import clear_driver_cache, resolve_driver_path, _install_driver
+
+    config = load_config(setup_if_missing=False) or {}
+    browser = config.get("browser", "chrome")
+    print(f"--- Время получения драйвера ({browser}), {rounds} повтор(а) ---")
+
+    results = {"webdriver_manager": [], "cold_cache": [], "warm_cache": []}
+    for _ in range(rounds):
+        results["webdriver_manager"].append(_timed(_install_driver, browser)[0])
+        clear_driver_cache()
+        results["cold_cache"].append(_timed(resolve_driver_path, browser)[0])
+        results["warm_cache"].append(_timed(resolve_driver_path, browser)[0])
+
+    for name, timings in results.items():
+        print(f"{name:>18}: мин {min(timings) * 1000:8.1f} мс, среднее {sum(timings) / len(timings) * 1000:8.1f} мс")
+
+
+HEAVY_MODULES = ("selenium", "webdriver_manager")
+IMPORT_BUDGET_MS = 500
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+heavy = sorted({name.split(".")[0] for name in sys.modules if name.split(".")[0] in %r})
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+''' % (HEAVY_MODULES,)
+
+
+def bench_imports(rounds=5):
+    rounds = int(rounds)
+    print(f"--- Время импорта main.py, {rounds} повтор(ов) ---")
+    timings = []
+    heavy = []
+    for _ in range(rounds):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output)
+        timings.append(result["elapsed"])
+        heavy = result["heavy"]
+
+    best_ms = min(timings) * 1000
+    print(f"мин {best_ms:.1f} мс, среднее {sum(timings) / len(timings) * 1000:.1f} мс (бюджет {IMPORT_BUDGET_MS} мс)")
+
+    failed = False
+    if heavy:
+        print(f"❌ При старте импортируются тяжелые модули: {', '.join(heavy)}")
+        failed = True
+    if best_ms > IMPORT_BUDGET_MS:
+        print("❌ Время импорта превышает бюджет.")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Браузерный стек не загружается при старте.")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _load_history():
+    history = []
+    if os.path.exists(BENCHMARKS_FILE):
+        with open(BENCHMARKS_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return history
+
+
+def _append_history(entries):
+    os.makedirs(os.path.dirname(BENCHMARKS_FILE), exist_ok=True)
+    with open(BENCHMARKS_FILE, 'a', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _bench_http_backend(panel, config):
+    from http_backend import HttpBackend
+
+    login_time, response = _timed(requests.post, f"{panel.url}/login", allow_redirects=False, timeout=10,
+                                  data={"username": panel.login, "password": panel.password})
+    save_cookies([{"name": name, "value": value, "path": "/"} for name, value in response.cookies.items()],
+                 BENCH_ACCOUNT)
+
+    backend = HttpBackend(config)
+    try:
+        read_time, _ = _timed(backend.get_a_records, config["domains"])
+        update_time, _ = _timed(backend.update_records, dict.fromkeys(config["domains"], BENCH_NEW_IP))
+    finally:
+        backend.close()
+    return login_time, read_time, update_time
+
+
+def _bench_browser(panel, config):
+    from dns_updater import TimeWebManager
+
+    manager = TimeWebManager(config)
+    try:
+        login_time, logged_in = _timed(manager.login)
+        if not logged_in:
+            raise RuntimeError("не удалось войти в mock-панель")
+        read_time, _ = _timed(manager.get_a_records)
+        update_time, _ = _timed(manager.update_a_records, BENCH_NEW_IP)
+    finally:
+        manager.close()
+    return login_time, read_time, update_time
+
+
+def bench_panel(*sizes, backends=("http", "chrome", "firefox")):
+    from mock_panel import MockPanel
+
+    sizes = [int(size) for size in sizes] or [1, 10, 100]
+    commit = _git_commit()
+    history = _load_history()
+    entries = []
+    for size in sizes:
+        domains = ["example.test"] + [f"sub{i}.example.test" for i in range(1, size)]
+        for backend in backends:
+            panel = MockPanel(domains)
+            panel.start()
+            config = {
+                "account": BENCH_ACCOUNT,
+                "panel_url": panel.url,
+                "timeweb_login": panel.login,
+                "timeweb_password": panel.password,
+                "domains": domains,
+                "browser": backend if backend != "http" else "chrome",
+                "panel_min_interval_seconds": 0,
+            }
+            delete_cookies(BENCH_ACCOUNT)
+            try:
+                bench = _bench_http_backend if backend == "http" else _bench_browser
+                login_time, read_time, update_time = bench(panel, config)
+            except Exception as e:
+                print(f"🟡 {backend}, {size} доменов: пропущено ({e})")
+                continue
+            finally:
+                panel.stop()
+
+            applied = sum(1 for fqdn in domains if panel.get_value(fqdn) == BENCH_NEW_IP)
+            entries.append({
+                "commit": commit,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "backend": backend,
+                "domains": size,
+                "login_seconds": round(login_time, 4),
+                "read_seconds": round(read_time, 4),
+                "update_seconds": round(update_time, 4),
+                "updates_per_second": round(size / update_time, 2) if update_time else None,
+                "applied": applied,
+            })
+
+    delete_cookies(BENCH_ACCOUNT)
+    _append_history(entries)
+
+    print(f"\n--- Результаты (коммит {commit}) ---")
+    for entry in entries:
+        previous = next((old for old in reversed(history) if old["commit"] != commit
+                         and old["backend"] == entry["backend"] and old["domains"] == entry["domains"]), None)
+        line = (f"{entry['backend']:>8} x{entry['domains']:<4} вход {entry['login_seconds']:7.3f} с, "
+                f"чтение {entry['read_seconds']:7.3f} с, обновление {entry['update_seconds']:7.3f} с "
+                f"({entry['updates_per_second']} зап./с, применено {entry['applied']}/{entry['domains']})")
+        if previous:
+            line += f"; было {previous['update_seconds']:.3f} с на {previous['commit']}"
+        print(line)
+
+
+def bench_lean(target="mock", pages=10):
+    from dns_updater import TimeWebManager
+    from procutil import RssSampler
+
+    pages = int(pages)
+    panel = None
+    if target == "live":
+        config = load_config(setup_if_missing=False)
+        if not config:
+            return
+        domains = config["domains"][:pages]
+    else:
+        from mock_panel import MockPanel
+        domains = ["example.test"] + [f"sub{i}.example.test" for i in range(1, pages)]
+        panel = MockPanel(domains)
+        panel.start()
+        config = {"account": BENCH_ACCOUNT, "panel_url": panel.url, "timeweb_login": panel.login,
+                  "timeweb_password": panel.password, "browser": "chrome", "panel_min_interval_seconds": 0}
+
+    results = {}
+    try:
+        for lean in (False, True):
+            manager = TimeWebManager(dict(config, domains=domains, lean_browser=lean))
+            try:
+                if not manager.login():
+                    print(f"🟡 lean_browser={lean}: не удалось войти, пропущено.")
+                    continue
+                with RssSampler(manager.driver.service.process.pid) as sampler:
+                    load_times = []
+                    for fqdn in domains:
+                        manager.driver.get("about:blank")
+                        load_times.append(_timed(manager._navigate_to_dns_page, fqdn)[0])
+                results[lean] = (sum(load_times) / len(load_times), sampler.peak_mb)
+            finally:
+                manager.close()
+    finally:
+        if panel:
+            panel.stop()
+        delete_cookies(BENCH_ACCOUNT)
+
+    print(f"\n--- Облегченный режим браузера ({target}, {len(domains)} стр.) ---")
+    for lean, (load_time, peak_mb) in results.items():
+        print(f"lean_browser={str(lean).lower():>5}: загрузка страницы {load_time * 1000:8.1f} мс, "
+              f"пиковая память {peak_mb:7.1f} МБ")
+
+
+BENCHMARKS = {
+    "drivers": bench_drivers,
+    "imports": bench_imports,
+    "lean": bench_lean,
+    "panel": bench_panel,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Использование: python benchmark.py <{'|'.join(BENCHMARKS)}>")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
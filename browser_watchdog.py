@@ -0,0 +1,126 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+from procutil import process_tree, process_start_time, tree_rss_mb, kill_tree
+from utils import register_browser_processes, unregister_browser_processes, load_browser_processes
+
+CHECK_INTERVAL_SECONDS = 1
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+class BrowserWatchdog:
+
+    def __init__(self, pid, name, timeout_seconds=180, memory_limit_mb=1024):
+        self.pid = pid
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.peak_mb = 0.0
+        self.breach = None
+        self._start_time = None
+        self._registered = []
+        self._operation = None
+        self._deadline = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._start_time = process_start_time(self.pid)
+        owner = os.getpid()
+        owner_start_time = process_start_time(owner)
+        processes = [(pid, process_start_time(pid), owner, owner_start_time) for pid in process_tree(self.pid)]
+        register_browser_processes(processes)
+        self._registered = [(pid, start_time) for pid, start_time, _, _ in processes]
+        with _active_lock:
+            _active.add(self)
+        self._thread = threading.Thread(target=self._run, name=f"watchdog-{self.pid}", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def operation(self, name, timeout_seconds=None):
+        self._operation = name
+        self._deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+        try:
+            yield
+        finally:
+            self._operation = None
+            self._deadline = None
+
+    def _run(self):
+        while not self._stop.wait(CHECK_INTERVAL_SECONDS):
+            if not self._owns_pid():
+                return
+            rss = tree_rss_mb(self.pid)
+            self.peak_mb = max(self.peak_mb, rss)
+            deadline = self._deadline
+            if deadline is not None and time.monotonic() > deadline:
+                self._kill("timeout", f"операция '{self._operation}' идет дольше {self.timeout_seconds} с")
+            elif self.memory_limit_mb and rss > self.memory_limit_mb:
+                self._kill("memory", f"браузер занял {rss:.0f} МБ при лимите {self.memory_limit_mb} МБ")
+
+    def _kill(self, kind, reason):
+        self.breach = reason
+        self._stop.set()
+        print(f"  - ⚠️  Сторож браузера: {reason}. Завершаю все процессы браузера.")
+        metrics.observe("browser_watchdog", 0, ok=False, reason=kind)
+        if self._owns_pid():
+            kill_tree(self.pid)
+
+    def _owns_pid(self):
+        # После quit() PID драйвера может достаться чужому процессу, например браузеру другого аккаунта
+        return self._start_time is not None and process_start_time(self.pid) == self._start_time
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._owns_pid():
+            self.peak_mb = max(self.peak_mb, tree_rss_mb(self.pid))
+        # После quit() дочерние процессы могли остаться без драйвера; драйвер тоже в этом списке
+        for pid, start_time in self._registered:
+            if start_time is not None and process_start_time(pid) == start_time:
+                kill_tree(pid)
+        unregister_browser_processes([pid for pid, _ in self._registered])
+        with _active_lock:
+            _active.discard(self)
+        metrics.set_gauge("browser_peak_rss_megabytes", round(self.peak_mb, 1), browser=self.name)
+        return self.peak_mb
+
+
+def sweep_orphans():
+    own_pid = os.getpid()
+    killed = 0
+    stale = []
+    for pid, start_time, owner_pid, owner_start_time in load_browser_processes():
+        owner_alive = owner_start_time is not None and process_start_time(owner_pid) == owner_start_time
+        if owner_alive and owner_pid != own_pid:
+            continue
+        if owner_alive:
+            with _active_lock:
+                if any(pid in dict(watchdog._registered) for watchdog in _active):
+                    continue
+        if start_time is not None and process_start_time(pid) == start_time:
+            kill_tree(pid)
+            killed += 1
+        stale.append(pid)
+    if stale:
+        unregister_browser_processes(stale)
+    if killed:
+        print(f"🧹 Завершены процессы браузера, оставшиеся от прошлых запусков: {killed}")
+    return killed
+
+
+def _stop_all():
+    with _active_lock:
+        watchdogs = list(_active)
+    for watchdog in watchdogs:
+        watchdog.stop()
+
+
+atexit.register(_stop_all)
@@ -0,0 +1,54 @@
+import time
+
+from utils import load_pending_changes, update_pending_changes
+
+
+def enqueue(changes):
+    if not changes:
+        return
+    now = time.time()
+
+    def add(pending):
+        for fqdn, value in changes.items():
+            entry = pending.get(fqdn)
+            # Повтор того же значения не сдвигает окно ожидания
+            if entry and entry["value"] == value:
+                continue
+            pending[fqdn] = {"value": value, "queued_at": now, "attempts": 0}
+
+    update_pending_changes(add)
+
+
+def discard(fqdns):
+    def remove(pending):
+        return [fqdn for fqdn in fqdns if pending.pop(fqdn, None)]
+
+    return update_pending_changes(remove)
+
+
+def due_changes(debounce_seconds):
+    now = time.time()
+    return {fqdn: entry for fqdn, entry in load_pending_changes().items()
+            if now - entry["queued_at"] >= debounce_seconds}
+
+
+def next_due_in(debounce_seconds):
+    now = time.time()
+    waits = [entry["queued_at"] + debounce_seconds - now for entry in load_pending_changes().values()]
+    waits = [wait for wait in waits if wait > 0]
+    return min(waits) if waits else None
+
+
+def complete(applied, results):
+    def settle(pending):
+        for fqdn, entry in applied.items():
+            current = pending.get(fqdn)
+            # Пока шло обновление, запись могла получить новое значение
+            if not current or current["queued_at"] != entry["queued_at"]:
+                continue
+            if results.get(fqdn):
+                del pending[fqdn]
+            else:
+                current["attempts"] = current.get("attempts", 0) + 1
+
+    update_pending_changes(settle)
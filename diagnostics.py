@@ -0,0 +1,159 @@
+import atexit
+import json
+import os
+import queue
+import re
+import threading
+import time
+import zipfile
+
+import metrics
+from utils import DATA_DIR
+
+DIAGNOSTICS_DIR = os.path.join(DATA_DIR, 'diagnostics')
+QUEUE_SIZE = 4
+FLUSH_TIMEOUT_SECONDS = 10
+
+NETWORK_EVENTS_JS = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return {
+    requests: (window.__twNetwork && window.__twNetwork.log) || [],
+    resources: entries.slice(-100).map(function (entry) {
+        return {
+            name: entry.name,
+            type: entry.initiatorType || entry.entryType,
+            start_ms: Math.round(entry.startTime),
+            duration_ms: Math.round(entry.duration),
+            status: entry.responseStatus || null,
+            size: entry.transferSize || 0
+        };
+    })
+};
+"""
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def capture(driver, config, reason, **context):
+    if not config.get("diagnostics_max_bundles", 20):
+        return None
+
+    started = time.monotonic()
+    name = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}-{_slug(reason)}"
+    bundle = {
+        "meta": {
+            "reason": reason,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "context": context,
+            "browser": config.get("browser", "chrome"),
+        },
+        "phases": metrics.recent(),
+        "errors": {},
+    }
+    # В основном потоке только забираем данные из браузера, сжатие и запись идут в фоне
+    for key, read in (("url", lambda: driver.current_url),
+                      ("screenshot", driver.get_screenshot_as_png),
+                      ("dom", lambda: driver.page_source),
+                      ("network", lambda: driver.execute_script(NETWORK_EVENTS_JS))):
+        try:
+            bundle[key] = read()
+        except Exception as e:
+            bundle["errors"][key] = str(e)
+    bundle["meta"]["capture_seconds"] = round(time.monotonic() - started, 3)
+
+    try:
+        _queue.put_nowait((name, bundle, _limits(config)))
+    except queue.Full:
+        print("  - 🟡 Очередь диагностики переполнена, отчет об ошибке пропущен.")
+        return None
+    _ensure_writer()
+    return name
+
+
+def _limits(config):
+    return (config.get("diagnostics_max_bundles", 20),
+            config.get("diagnostics_max_mb", 20) * 1024 * 1024,
+            config.get("diagnostics_retention_days", 14) * 86400)
+
+
+def _slug(text):
+    return re.sub(r'[^\w.-]+', '_', text)[:60]
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="diagnostics", daemon=True)
+            _writer.start()
+
+
+def _write_loop():
+    while True:
+        name, bundle, limits = _queue.get()
+        try:
+            path = _write_bundle(name, bundle)
+            prune(*limits)
+            print(f"  - ℹ️  Диагностика сохранена: {os.path.relpath(path, DATA_DIR)}")
+        except OSError as e:
+            print(f"  - 🟡 Не удалось сохранить диагностику: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _write_bundle(name, bundle):
+    os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+    path = os.path.join(DIAGNOSTICS_DIR, f"{name}.zip")
+    tmp_path = f"{path}.tmp"
+    meta = dict(bundle["meta"], url=bundle.get("url"), errors=bundle["errors"])
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        archive.writestr("meta.json", json.dumps(meta, ensure_ascii=False, indent=2))
+        archive.writestr("phases.json", json.dumps(bundle["phases"], ensure_ascii=False, indent=2))
+        if bundle.get("dom") is not None:
+            archive.writestr("dom.html", bundle["dom"])
+        if bundle.get("network") is not None:
+            archive.writestr("network.json", json.dumps(bundle["network"], ensure_ascii=False, indent=2))
+        if bundle.get("screenshot"):
+            # PNG уже сжат, повторное сжатие только тратит время
+            archive.writestr("screenshot.png", bundle["screenshot"], compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_bundles():
+    if not os.path.isdir(DIAGNOSTICS_DIR):
+        return []
+    bundles = []
+    for entry in os.scandir(DIAGNOSTICS_DIR):
+        if entry.name.endswith('.zip'):
+            stat = entry.stat()
+            bundles.append((stat.st_mtime, stat.st_size, entry.path))
+    return sorted(bundles)
+
+
+def prune(max_bundles, max_bytes, retention_seconds):
+    bundles = list_bundles()
+    cutoff = time.time() - retention_seconds
+    total = sum(size for _, size, _ in bundles)
+    removed = 0
+    # Самые старые отчеты удаляются первыми, самый свежий остается всегда
+    while len(bundles) > 1 and (len(bundles) > max_bundles or total > max_bytes or bundles[0][0] < cutoff):
+        _, size, path = bundles.pop(0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def flush(timeout=FLUSH_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+atexit.register(flush)
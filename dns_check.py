@@ -0,0 +1,188 @@
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+TIMEWEB_NAMESERVERS = ["ns1.timeweb.ru", "ns2.timeweb.ru", "ns3.timeweb.org", "ns4.timeweb.org"]
+DNS_PORT = 53
+QUERY_TIMEOUT = 3
+MAX_CACHE_SECONDS = 300
+
+TYPE_A = 1
+CLASS_IN = 1
+RCODE_NXDOMAIN = 3
+
+_cache = {}
+_cache_lock = threading.Lock()
+_address_cache = {}
+
+
+class DnsError(Exception):
+    pass
+
+
+def _parse_nameserver(nameserver):
+    host, _, port = nameserver.rpartition(":") if nameserver.count(":") == 1 else (nameserver, "", "")
+    return host, int(port) if port else DNS_PORT
+
+
+def _nameserver_address(nameserver):
+    if nameserver not in _address_cache:
+        host, port = _parse_nameserver(nameserver)
+        info = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)
+        _address_cache[nameserver] = info[0][4]
+    return _address_cache[nameserver]
+
+
+def build_query(fqdn, query_id):
+    header = struct.pack("!HHHHHH", query_id, 0, 1, 0, 0, 0)
+    qname = b"".join(bytes([len(label)]) + label.encode("idna") for label in fqdn.rstrip(".").split("."))
+    return header + qname + b"\x00" + struct.pack("!HH", TYPE_A, CLASS_IN)
+
+
+def _skip_name(data, offset):
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += 1
+        if length == 0:
+            return offset
+        offset += length
+
+
+def parse_response(data, query_id):
+    if len(data) < 12:
+        raise DnsError("слишком короткий ответ")
+    response_id, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", data[:12])
+    if response_id != query_id:
+        raise DnsError("ответ на чужой запрос")
+    rcode = flags & 0x0F
+    if rcode == RCODE_NXDOMAIN:
+        return [], MAX_CACHE_SECONDS
+    if rcode:
+        raise DnsError(f"код ошибки {rcode}")
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+
+    values = []
+    ttl = MAX_CACHE_SECONDS
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        record_type, record_class, record_ttl, length = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        if record_type == TYPE_A and record_class == CLASS_IN and length == 4:
+            values.append(socket.inet_ntoa(data[offset:offset + 4]))
+            ttl = min(ttl, record_ttl)
+        offset += length
+    return sorted(values), ttl
+
+
+def _query_tcp(address, query):
+    with socket.create_connection(address, timeout=QUERY_TIMEOUT) as sock:
+        sock.sendall(struct.pack("!H", len(query)) + query)
+        header = b""
+        while len(header) < 2:
+            chunk = sock.recv(2 - len(header))
+            if not chunk:
+                raise DnsError("соединение закрыто")
+            header += chunk
+        length = struct.unpack("!H", header)[0]
+        data = b""
+        while len(data) < length:
+            chunk = sock.recv(length - len(data))
+            if not chunk:
+                raise DnsError("соединение закрыто")
+            data += chunk
+    return data
+
+
+def query_a(fqdn, nameserver, use_cache=True):
+    key = (fqdn.lower(), nameserver)
+    if use_cache:
+        with _cache_lock:
+            cached = _cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+    started = time.monotonic()
+    ok = False
+    try:
+        address = _nameserver_address(nameserver)
+        query_id = random.randint(0, 0xFFFF)
+        query = build_query(fqdn, query_id)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(QUERY_TIMEOUT)
+            sock.sendto(query, address)
+            data, _ = sock.recvfrom(4096)
+        # Флаг TC: ответ не поместился в UDP, повторяем по TCP
+        if len(data) >= 4 and data[2] & 0x02:
+            data = _query_tcp(address, query)
+        values, ttl = parse_response(data, query_id)
+        ok = True
+    except (OSError, struct.error, IndexError) as e:
+        raise DnsError(f"{nameserver}: {e}") from e
+    finally:
+        metrics.observe("dns_query", time.monotonic() - started, ok, nameserver=nameserver)
+
+    with _cache_lock:
+        _cache[key] = (values, time.monotonic() + min(ttl, MAX_CACHE_SECONDS))
+    return values
+
+
+def forget(domains):
+    # После изменения записи в панели закешированный ответ устарел
+    names = {fqdn.lower() for fqdn in domains}
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] in names]:
+            del _cache[key]
+
+
+def _nameservers(config):
+    return config.get("dns_nameservers") or TIMEWEB_NAMESERVERS
+
+
+def resolve_records(config, domains):
+    nameservers = _nameservers(config)
+
+    def resolve(fqdn):
+        for nameserver in nameservers:
+            try:
+                return fqdn, query_a(fqdn, nameserver)
+            except DnsError as e:
+                print(f"🟡 DNS-запрос {fqdn} не удался: {e}")
+        return fqdn, None
+
+    if not domains:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(16, len(domains)), thread_name_prefix="dns") as executor:
+        return dict(executor.map(resolve, domains))
+
+
+def verify_propagation(config, domains, ip, timeout=60, interval=5):
+    nameservers = _nameservers(config)
+    pending = {(fqdn, nameserver) for fqdn in domains for nameserver in nameservers}
+    deadline = time.monotonic() + timeout
+
+    def check(item):
+        fqdn, nameserver = item
+        try:
+            return item, query_a(fqdn, nameserver, use_cache=False) == [ip]
+        except DnsError:
+            return item, False
+
+    with ThreadPoolExecutor(max_workers=min(16, len(pending) or 1), thread_name_prefix="dns") as executor:
+        while pending:
+            pending = {item for item, ok in executor.map(check, pending) if not ok}
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+
+    lagging = {fqdn for fqdn, _ in pending}
+    return {fqdn: fqdn not in lagging for fqdn in domains}
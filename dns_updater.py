@@ -1,130 +1,451 @@
 import time
-import json
-import os
+import requests
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 
 # Chrome
 from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
 
 # Firefox
 from selenium.webdriver.firefox.service import Service as FirefoxService
-from webdriver_manager.firefox import GeckoDriverManager
 
-DATA_DIR = os.getenv('DATA_DIR', '.')
-COOKIES_FILE = os.path.join(DATA_DIR, 'cookies.json')
+import diagnostics
+import metrics
+from browser_watchdog import BrowserWatchdog
+from procutil import kill_tree
+from drivers import CHROME_BINARY, resolve_driver_path
+
+from utils import PANEL_URL, load_cookies, save_cookies, dns_page_url, find_a_record, throttle_panel
+from zones import resolve_pages
+from http_backend import HttpBackend, probe_session, SESSION_EXPIRED
+
+TAB_LOAD_TIMEOUT_SECONDS = 30
+
+SCRAPE_DNS_TABLE_JS = """
+return Array.from(document.querySelectorAll('tr')).map(function (row) {
+    var cells = row.querySelectorAll('td');
+    if (cells.length < 3) {
+        return null;
+    }
+    var edit = row.querySelector('button.js-edit-record');
+    return {
+        name: cells[0].textContent.trim(),
+        type: cells[1].textContent.trim(),
+        value: cells[2].textContent.trim(),
+        id: row.getAttribute('data-id') || (edit && (edit.getAttribute('data-id') || edit.getAttribute('data-record-id')))
+    };
+}).filter(Boolean);
+"""
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp4", "*.webm",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*mc.yandex.ru*", "*top-fwz1.mail.ru*", "*facebook.net*", "*vk.com/rtrg*",
+    "*jivosite.com*", "*code.jivo.ru*",
+]
+
+TRACK_NETWORK_JS = """
+if (!window.__twNetwork) {
+    var net = window.__twNetwork = {pending: 0, listeners: [], log: []};
+    var finish = function () {
+        net.pending--;
+        net.listeners.forEach(function (listener) { setTimeout(listener, 0); });
+    };
+    var record = function (entry) {
+        net.log.push(entry);
+        if (net.log.length > 50) {
+            net.log.shift();
+        }
+    };
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function (resource) {
+            var entry = {type: 'fetch', url: String((resource && resource.url) || resource), started: Date.now()};
+            net.pending++;
+            return originalFetch.apply(this, arguments).then(function (response) {
+                entry.status = response.status;
+                return response;
+            }, function (error) {
+                entry.error = String(error);
+                throw error;
+            }).finally(function () {
+                entry.duration_ms = Date.now() - entry.started;
+                record(entry);
+                finish();
+            });
+        };
+    }
+    var originalOpen = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__twEntry = {type: 'xhr', method: method, url: String(url)};
+        return originalOpen.apply(this, arguments);
+    };
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        var xhr = this, entry = xhr.__twEntry || {type: 'xhr'};
+        entry.started = Date.now();
+        net.pending++;
+        xhr.addEventListener('loadend', function () {
+            entry.status = xhr.status;
+            entry.duration_ms = Date.now() - entry.started;
+            record(entry);
+            finish();
+        });
+        return originalSend.apply(this, arguments);
+    };
+}
+"""
+
+WAIT_SAVED_JS = """
+var fqdn = arguments[0], value = arguments[1], timeout = arguments[2], done = arguments[arguments.length - 1];
+var net = window.__twNetwork;
+
+function rowValue() {
+    var rows = document.querySelectorAll('tr');
+    for (var i = 0; i < rows.length; i++) {
+        var cells = rows[i].querySelectorAll('td');
+        if (cells.length >= 3 && cells[0].textContent.trim() === fqdn && cells[1].textContent.trim() === 'A') {
+            return cells[2].textContent.trim();
+        }
+    }
+    return null;
+}
+
+function modalOpen() {
+    return Array.prototype.some.call(document.querySelectorAll('.k-window'), function (modal) {
+        return modal.offsetParent !== null;
+    });
+}
+
+function settled() {
+    return (!net || net.pending === 0) && !modalOpen() && rowValue() === value;
+}
+
+if (settled()) {
+    return done(true);
+}
+var observer = new MutationObserver(check);
+var timer = setTimeout(function () { finish(false); }, timeout);
+
+function finish(result) {
+    clearTimeout(timer);
+    observer.disconnect();
+    if (net) {
+        net.listeners = net.listeners.filter(function (listener) { return listener !== check; });
+    }
+    done(result);
+}
+
+function check() {
+    if (settled()) {
+        finish(true);
+    }
+}
+
+observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true});
+if (net) {
+    net.listeners.push(check);
+}
+"""
 
 
 class TimeWebManager:
 
     def __init__(self, config):
         self.config = config
+        self.panel_url = config.get("panel_url", PANEL_URL)
         self.driver = None
         self.wait = None
         self.logged_in = False
+        self.watchdog = None
+        self.page_urls = {}
 
     def _initialize_driver(self):
         browser_type = self.config.get("browser", "chrome").lower()
         user_agent = "Mozilla/5.0 (X11; Linux x86_64; rv:139.0) Gecko/20100101 Firefox/139.0"
+        with metrics.phase("driver_install", browser=browser_type):
+            driver_path = resolve_driver_path(browser_type, offline=self.config.get("offline_drivers", False))
+        launch_started = time.monotonic()
+
+        lean = self.config.get("lean_browser", False)
+        width, height = (1280, 800) if lean else (1920, 1080)
 
         if browser_type == "firefox":
             print("  - Используем Firefox")
             options = webdriver.FirefoxOptions()
             options.add_argument("--headless")
-            options.add_argument("--width=1920")
-            options.add_argument("--height=1080")
+            options.add_argument(f"--width={width}")
+            options.add_argument(f"--height={height}")
             options.set_preference("general.useragent.override", user_agent)
             options.set_preference("dom.webdriver.enabled", False)
             options.set_preference('useAutomationExtension', False)
-            service = FirefoxService(GeckoDriverManager().install())
-            self.driver = webdriver.Firefox(service=service, options=options)
+            if lean:
+                options.page_load_strategy = "eager"
+                options.set_preference("permissions.default.image", 2)
+                options.set_preference("gfx.downloadable_fonts.enabled", False)
+                options.set_preference("media.autoplay.default", 5)
+                options.set_preference("privacy.trackingprotection.enabled", True)
+                options.set_preference("dom.ipc.processCount", 1)
+                options.set_preference("fission.autostart", False)
+                options.set_preference("browser.cache.memory.capacity", 16384)
+                options.set_preference("network.prefetch-next", False)
+            service = FirefoxService(driver_path)
+            self.driver = _start_driver(webdriver.Firefox, service, options)
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         else:
             print("  - Используем Chrome")
             options = webdriver.ChromeOptions()
-            options.binary_location = "/usr/bin/google-chrome"
+            options.binary_location = CHROME_BINARY
             options.add_argument("--headless")
             options.add_argument("--no-sandbox")
             options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--window-size=1920,1080")
+            options.add_argument(f"--window-size={width},{height}")
             options.add_argument(f'user-agent={user_agent}')
             options.add_argument("--disable-blink-features=AutomationControlled")
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
-            service = ChromeService(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
-            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument',
-                                        {
-                                            'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"})
-        self.wait = WebDriverWait(self.driver, 10)
+            if lean:
+                options.page_load_strategy = "eager"
+                options.add_argument("--blink-settings=imagesEnabled=false")
+                options.add_argument("--disable-extensions")
+                options.add_argument("--disable-gpu")
+                options.add_argument("--disable-background-networking")
+                options.add_argument("--disable-component-update")
+                options.add_argument("--renderer-process-limit=2")
+                options.add_argument("--js-flags=--max-old-space-size=256")
+                options.add_argument("--mute-audio")
+            service = ChromeService(driver_path)
+            self.driver = _start_driver(webdriver.Chrome, service, options)
+            self._prepare_tab()
+        metrics.observe("browser_launch", time.monotonic() - launch_started, browser=browser_type)
+        self.watchdog = BrowserWatchdog(self.driver.service.process.pid, browser_type,
+                                        self.config.get("browser_operation_timeout_seconds", 180),
+                                        self.config.get("browser_memory_limit_mb", 1024))
+        self.watchdog.start()
+        self.wait = self._make_wait(10)
+
+    def _prepare_tab(self):
+        # Настройки CDP действуют только на текущую вкладку
+        if self.config.get("browser", "chrome").lower() == "firefox":
+            return
+        self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument',
+                                    {'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"})
+        if self.config.get("lean_browser", False):
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+
+    def _make_wait(self, timeout):
+        return WebDriverWait(self.driver, timeout, poll_frequency=self.config.get("wait_poll_seconds", 0.1))
+
+    def _wait_saved(self, fqdn, new_ip, timeout=10):
+        self.driver.set_script_timeout(timeout + 5)
+        try:
+            return self.driver.execute_async_script(WAIT_SAVED_JS, fqdn, new_ip, timeout * 1000)
+        except WebDriverException as e:
+            # Панель могла перезагрузить страницу после сохранения, и скрипт ожидания прервался вместе с ней
+            print(f"  - 🟡 Ожидание сохранения прервано: {e.msg or type(e).__name__}")
+            return False
 
     def _save_cookies(self):
-        os.makedirs(os.path.dirname(COOKIES_FILE), exist_ok=True)
-        with open(COOKIES_FILE, 'w') as f:
-            json.dump(self.driver.get_cookies(), f)
+        save_cookies(self.driver.get_cookies(), self.config.get("account"))
         print("  - ℹ️  Куки сессии сохранены.")
 
     def _load_cookies(self):
-        if os.path.exists(COOKIES_FILE):
-            with open(COOKIES_FILE, 'r') as f:
-                cookies = json.load(f)
-            for cookie in cookies:
-                self.driver.add_cookie(cookie)
-            return True
-        return False
+        cookies = load_cookies(self.config.get("account"))
+        if not cookies:
+            return False
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+        return True
+
+    @contextmanager
+    def _supervised(self, operation):
+        if not self.watchdog:
+            yield
+            return
+        try:
+            with self.watchdog.operation(operation):
+                yield
+        except Exception as e:
+            if self.watchdog.breach:
+                raise WebDriverException(f"браузер остановлен сторожем: {self.watchdog.breach}") from e
+            raise
 
     def login(self):
         try:
+            with metrics.phase("session_probe"):
+                session_state = probe_session(self.config)
             self._initialize_driver()
-            print("  - Пытаюсь войти с помощью сохраненных куки...")
-            self.driver.get("https://hosting.timeweb.ru/")
-            if self._load_cookies():
-                self.driver.refresh()
-                try:
-                    self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "a[href='/domains']")))
-                    print("  - ✅ Вход по куки успешен!")
-                    self.logged_in = True
-                    return True
-                except TimeoutException:
-                    print("  - ❌ Вход по куки не удался. Выполняю стандартную авторизацию.")
-
-            self.wait = WebDriverWait(self.driver, 30)
-            print("  - Открываю страницу авторизации...")
-            self.driver.get("https://hosting.timeweb.ru/")
-            username_input = self.wait.until(EC.element_to_be_clickable((By.NAME, "username")))
-            username_input.send_keys(self.config["timeweb_login"])
-            self.driver.find_element(By.NAME, "password").send_keys(self.config["timeweb_password"])
-            self.driver.find_element(By.CSS_SELECTOR, "button[type='submit']").click()
-            self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "a[href='/domains']")))
-            print("  - ✅ Успешная авторизация")
-            self._save_cookies()
-            self.logged_in = True
-            return True
+            with self._supervised("login"):
+                return self._login(session_state != SESSION_EXPIRED)
 
         except TimeoutException:
             print(f"  - ❌ Ошибка: Элемент не найден или страница не загрузилась вовремя.")
-            screenshot_path = os.path.join(DATA_DIR, 'error_screenshot.png')
-            self.driver.save_screenshot(screenshot_path)
-            print(f"  - ℹ️  Скриншот сохранен для анализа.")
+            self._capture_diagnostics("login")
             return False
         except Exception as e:
             print(f"  - ❌ Произошла непредвиденная ошибка при авторизации: {e}")
             return False
 
+    def _login(self, try_cookies):
+        if not try_cookies:
+            print("  - ℹ️  Сохраненная сессия недействительна, сразу выполняю авторизацию.")
+        else:
+            print("  - Вхожу с помощью сохраненных куки...")
+            started = time.monotonic()
+            self.driver.get(f"{self.panel_url}/")
+            self._load_cookies()
+            self.driver.refresh()
+            try:
+                self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "a[href='/domains']")))
+                metrics.observe("cookie_login", time.monotonic() - started)
+                print("  - ✅ Вход по куки успешен!")
+                self.logged_in = True
+                return True
+            except TimeoutException:
+                metrics.observe("cookie_login", time.monotonic() - started, ok=False)
+                print("  - ❌ Вход по куки не удался. Выполняю стандартную авторизацию.")
+
+        started = time.monotonic()
+        self.wait = self._make_wait(30)
+        print("  - Открываю страницу авторизации...")
+        self.driver.get(f"{self.panel_url}/")
+        username_input = self.wait.until(EC.element_to_be_clickable((By.NAME, "username")))
+        username_input.send_keys(self.config["timeweb_login"])
+        self.driver.find_element(By.NAME, "password").send_keys(self.config["timeweb_password"])
+        self.driver.find_element(By.CSS_SELECTOR, "button[type='submit']").click()
+        self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "a[href='/domains']")))
+        metrics.observe("full_login", time.monotonic() - started)
+        print("  - ✅ Успешная авторизация")
+        self._save_cookies()
+        self.logged_in = True
+        return True
+
+    def _capture_diagnostics(self, reason, **context):
+        if self.driver and not (self.watchdog and self.watchdog.breach):
+            diagnostics.capture(self.driver, self.config, reason, **context)
+
+    def is_alive(self):
+        if not self.driver or not self.logged_in:
+            return False
+        if self.watchdog and self.watchdog.breach:
+            return False
+        try:
+            # Ссылка в уже загруженной странице ничего не говорит о сессии на сервере: спрашиваем заново
+            throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+            self.driver.get(f"{self.panel_url}/")
+            self._make_wait(5).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, "a[href='/domains']")))
+            return True
+        except (TimeoutException, WebDriverException):
+            return False
+
     def update_a_records(self, new_ip):
+        return self.update_records(dict.fromkeys(self.config["domains"], new_ip))
+
+    def update_records(self, changes):
         if not self.logged_in:
             print("  - ❌ Необходима авторизация для обновления записей.")
-            return False
+            return dict.fromkeys(changes, False)
+
+        pages, rejected = self.resolve_pages(list(changes))
+        results = dict.fromkeys(rejected, False)
+        results.update(self._process_pages(pages, lambda url, fqdns: self._update_page(url, fqdns, changes), False))
+        return results
 
-        all_successful = True
-        for fqdn in self.config["domains"]:
-            if not self.update_single_record(fqdn, new_ip):
-                all_successful = False
-        return all_successful
+    def _update_page(self, url, fqdns, changes):
+        results = {}
+        with self._supervised(f"update {url}"):
+            try:
+                rows = self._load_dns_table(url, fqdns)
+            except TimeoutException:
+                print(f"  - ❌ Не удалось загрузить таблицу DNS для: {', '.join(fqdns)}")
+                return dict.fromkeys(fqdns, False)
+
+            for fqdn in fqdns:
+                row = find_a_record(rows, fqdn)
+                if row and row["value"] == changes[fqdn]:
+                    print(f"  - ℹ️  IP-адрес для {fqdn} уже {changes[fqdn]}. Пропускаю.")
+                    results[fqdn] = True
+                    continue
+                results[fqdn] = self.update_single_record(fqdn, changes[fqdn])
+        return results
+
+    def _process_pages(self, pages, process, failed_value):
+        results = {}
+        tabs = min(self.config.get("browser_tabs", 1), len(pages))
+        if tabs > 1:
+            return self._process_pages_in_tabs(pages, process, failed_value, tabs)
+        for url, fqdns in pages.items():
+            if self.watchdog and self.watchdog.breach:
+                results.update(dict.fromkeys(fqdns, failed_value))
+                continue
+            results.update(process(url, fqdns))
+        return results
+
+    def _process_pages_in_tabs(self, pages, process, failed_value, tabs):
+        print(f"  - Загружаю страницы DNS параллельно в {tabs} вкладках.")
+        queue = list(pages.items())
+        main_handle = self.driver.current_window_handle
+        handles = [main_handle]
+        loading = {}
+        results = {}
+        try:
+            for _ in range(tabs - 1):
+                self.driver.switch_to.new_window('tab')
+                self._prepare_tab()
+                handles.append(self.driver.current_window_handle)
+
+            while queue or loading:
+                if self.watchdog and self.watchdog.breach:
+                    for url, fqdns in queue + [(url, fqdns) for url, fqdns, _ in loading.values()]:
+                        results.update(dict.fromkeys(fqdns, failed_value))
+                    break
+                for handle in handles:
+                    if handle not in loading and queue:
+                        url, fqdns = queue.pop(0)
+                        self._start_tab_load(handle, url)
+                        loading[handle] = (url, fqdns, time.monotonic())
+
+                with self._supervised("tabs"):
+                    handle = self._next_ready_tab(loading)
+                url, fqdns, _ = loading.pop(handle)
+                results.update(process(url, fqdns))
+        finally:
+            self._close_tabs(handles[1:], main_handle)
+        return results
+
+    def _start_tab_load(self, handle, url):
+        self.driver.switch_to.window(handle)
+        throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+        print(f"  - Открываю во вкладке: {url}")
+        # Метка пропадет вместе со старым документом, так видно, что новая страница загрузилась
+        self.driver.execute_script("window.__twStale = true; window.location.href = arguments[0];", url)
+
+    def _next_ready_tab(self, loading):
+        poll = self.config.get("wait_poll_seconds", 0.1)
+        while True:
+            for handle, (url, fqdns, started) in loading.items():
+                self.driver.switch_to.window(handle)
+                ready = self.driver.execute_script(
+                    "return !window.__twStale && document.readyState !== 'loading';")
+                # Зависшую вкладку все равно отдаем обработчику, он сообщит об ошибке по таймауту
+                if ready or time.monotonic() - started > TAB_LOAD_TIMEOUT_SECONDS:
+                    return handle
+            time.sleep(poll)
+
+    def _close_tabs(self, handles, main_handle):
+        try:
+            for handle in handles:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(main_handle)
+        except WebDriverException:
+            pass
 
     def update_single_record(self, fqdn, new_ip):
         try:
@@ -133,13 +454,15 @@ class TimeWebManager:
 
             print(f"  - Ищу A-запись для '{fqdn}'...")
             xpath_row = f"//tr[td[1][normalize-space()='{fqdn}'] and td[2][normalize-space()='A']]"
-            dns_row = self.wait.until(EC.visibility_of_element_located((By.XPATH, xpath_row)))
+            with metrics.phase("row_wait", fqdn=fqdn):
+                dns_row = self.wait.until(EC.visibility_of_element_located((By.XPATH, xpath_row)))
 
-            edit_button = dns_row.find_element(By.CSS_SELECTOR, "button.js-edit-record")
-            edit_button.click()
+            with metrics.phase("modal_open", fqdn=fqdn):
+                edit_button = dns_row.find_element(By.CSS_SELECTOR, "button.js-edit-record")
+                edit_button.click()
 
-            modal_xpath = "//div[contains(@class, 'k-window') and contains(., 'Редактировать A-запись')]"
-            modal_window = self.wait.until(EC.visibility_of_element_located((By.XPATH, modal_xpath)))
+                modal_xpath = "//div[contains(@class, 'k-window') and contains(., 'Редактировать A-запись')]"
+                modal_window = self.wait.until(EC.visibility_of_element_located((By.XPATH, modal_xpath)))
 
             ip_input_xpath = ".//input[contains(@class, 'cpS-combobox-input') or (@name='value' and not(contains(@style,'display: none')))]"
             ip_input = modal_window.find_element(By.XPATH, ip_input_xpath)
@@ -155,19 +478,21 @@ class TimeWebManager:
             ip_input.clear()
             ip_input.send_keys(new_ip)
 
-            save_button = modal_window.find_element(By.CSS_SELECTOR, "button.js-confirm")
-            save_button.click()
-            self.wait.until(EC.invisibility_of_element(save_button))
+            throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+            with metrics.phase("save", fqdn=fqdn):
+                self.driver.execute_script(TRACK_NETWORK_JS)
+                save_button = modal_window.find_element(By.CSS_SELECTOR, "button.js-confirm")
+                save_button.click()
+                if not self._wait_saved(fqdn, new_ip):
+                    print(f"  - 🟡 Не дождался нового значения в таблице для {fqdn}, проверяю закрытие окна.")
+                    self.wait.until(EC.invisibility_of_element(save_button))
 
             print(f"  - ✅ A-запись для {fqdn} обновлена на {new_ip}")
-            time.sleep(1)
             return True
 
         except (TimeoutException, NoSuchElementException):
             print(f"  - ❌ Не удалось найти или изменить A-запись для '{fqdn}'.")
-            screenshot_path = os.path.join(DATA_DIR, f'error_dns_{fqdn}.png')
-            self.driver.save_screenshot(screenshot_path)
-            print(f"  - ℹ️  Скриншот сохранен как {os.path.basename(screenshot_path)}")
+            self._capture_diagnostics(f"dns_{fqdn}", fqdn=fqdn, value=new_ip)
             return False
         except Exception as e:
             print(f"  - ❌ Ошибка при обновлении {fqdn}: {e}")
@@ -178,62 +503,297 @@ class TimeWebManager:
             print("  - ❌ Необходима авторизация для получения записей.")
             return None
 
-        records = {}
         print("\n  - Получаю текущие A-записи...")
-        for fqdn in self.config["domains"]:
-            try:
-                self._navigate_to_dns_page(fqdn)
-
-                xpath_row = f"//tr[td[1][normalize-space()='{fqdn}'] and td[2][normalize-space()='A']]"
-                dns_row = self.wait.until(EC.visibility_of_element_located((By.XPATH, xpath_row)))
-
-                ip_address = dns_row.find_element(By.XPATH, "./td[3]").text.strip()
-                records[fqdn] = ip_address
-                print(f"  - Найдено: {fqdn} -> {ip_address}")
+        pages, rejected = self.resolve_pages(self.config["domains"])
+        records = dict.fromkeys(rejected, "не найдена")
+        records.update(self._process_pages(pages, self._read_page, "не найдена"))
+        return records
 
-            except (TimeoutException, NoSuchElementException):
+    def _read_page(self, url, fqdns):
+        records = {}
+        with self._supervised(f"read {url}"):
+            try:
+                rows = self._load_dns_table(url, fqdns)
+            except TimeoutException:
+                rows = []
+
+        for fqdn in fqdns:
+            row = find_a_record(rows, fqdn)
+            if row:
+                records[fqdn] = row["value"]
+                print(f"  - Найдено: {fqdn} -> {row['value']}")
+            else:
                 print(f"  - ❌ Не удалось найти A-запись для '{fqdn}'.")
                 records[fqdn] = "не найдена"
-
         return records
 
+    def _load_dns_table(self, url, fqdns):
+        self._open_page(url)
+        # Таблица может дозаполняться скриптом: ждем строку одной из нужных записей, а не первую попавшуюся
+        names = " or ".join(f"normalize-space()='{fqdn}'" for fqdn in fqdns)
+        xpath_row = f"//tr[td[1][{names}] and td[2][normalize-space()='A']]"
+        with metrics.phase("table_scrape"):
+            self.wait.until(EC.presence_of_element_located((By.XPATH, xpath_row)))
+            return self.driver.execute_script(SCRAPE_DNS_TABLE_JS)
+
+    def resolve_pages(self, domains):
+        with self._supervised("zones"):
+            pages, rejected = resolve_pages(self.config, domains, self.panel_url, self._fetch_listing)
+        self.page_urls.update({fqdn: url for url, fqdns in pages.items() for fqdn in fqdns})
+        return pages, rejected
+
+    def _fetch_listing(self):
+        self._open_page(f"{self.panel_url}/domains")
+        try:
+            self._make_wait(10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/domains/dns-records/']")))
+        except TimeoutException:
+            return None
+        return self.driver.page_source
+
     def _navigate_to_dns_page(self, fqdn):
-        parts = fqdn.split('.')
-        is_subdomain = len(parts) > 2
-        if is_subdomain:
-            subdomain = parts[0]
-            domain = ".".join(parts[1:])
-            url = f"https://hosting.timeweb.ru/domains/dns-records/subdomain?fqdn={domain}&sub={subdomain}"
-        else:
-            domain = fqdn
-            url = f"https://hosting.timeweb.ru/domains/dns-records/domain?fqdn={domain}"
+        self._open_page(self.page_urls.get(fqdn) or dns_page_url(fqdn, self.panel_url))
 
+    def _open_page(self, url):
         if self.driver.current_url != url:
-            print(f"  - Перехожу на страницу DNS для {fqdn}")
-            self.driver.get(url)
+            print(f"  - Перехожу на страницу DNS: {url}")
+            throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+            with metrics.phase("navigate"):
+                self.driver.get(url)
 
     def close(self):
         if self.driver:
-            self.driver.quit()
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
             print("  - Браузер закрыт.")
+        if self.watchdog:
+            peak_mb = self.watchdog.stop()
+            print(f"  - ℹ️  Пиковая память браузера: {peak_mb:.0f} МБ")
+        self.driver = None
+        self.wait = None
+        self.logged_in = False
+        self.watchdog = None
+
+
+def _start_driver(driver_class, service, options):
+    try:
+        return driver_class(service=service, options=options)
+    except Exception:
+        # Драйвер мог успеть запуститься и запустить браузер до ошибки
+        process = getattr(service, "process", None)
+        if process:
+            kill_tree(process.pid)
+        raise
+
+
+class BrowserSession:
+
+    def __init__(self, config):
+        self.config = config
+        self.max_uses = config.get("session_max_uses", 20)
+        self.max_age_seconds = config.get("session_max_age_minutes", 360) * 60
+        self.manager = None
+        self.uses = 0
+        self.started_at = None
+        self.stats = {
+            "cold_starts": 0,
+            "warm_reuses": 0,
+            "recycles": 0,
+            "crashes": 0,
+            "cold_seconds": 0.0,
+            "warm_seconds": 0.0,
+            "peak_rss_mb": 0.0,
+        }
+
+    def _needs_recycle(self):
+        if self.uses >= self.max_uses:
+            return True
+        return time.monotonic() - self.started_at >= self.max_age_seconds
+
+    def acquire(self, config=None):
+        if config:
+            self.config = config
+        started = time.monotonic()
+
+        if self.manager and self._needs_recycle():
+            print("  - ♻️  Браузер отработал свой ресурс, перезапускаю сессию.")
+            self.stats["recycles"] += 1
+            self.close()
+
+        if self.manager:
+            self.manager.config = self.config
+            if self.manager.is_alive():
+                self.uses += 1
+                self.stats["warm_reuses"] += 1
+                self.stats["warm_seconds"] += time.monotonic() - started
+                print("  - ✅ Используется уже открытая сессия браузера.")
+                return self.manager
+            print("  - 🟡 Сессия браузера потеряна, запускаю заново.")
+            self.stats["crashes"] += 1
+            self.close()
+
+        self.manager = TimeWebManager(self.config)
+        if not self.manager.login():
+            self.close()
+            return None
+        self.started_at = time.monotonic()
+        self.uses = 1
+        self.stats["cold_starts"] += 1
+        self.stats["cold_seconds"] += time.monotonic() - started
+        return self.manager
+
+    def update_records(self, config, changes):
+        manager = self.acquire(config)
+        if not manager:
+            return dict.fromkeys(changes, False)
+        try:
+            return manager.update_records(changes)
+        except WebDriverException as e:
+            print(f"  - ❌ Браузер перестал отвечать: {e}")
+            self.stats["crashes"] += 1
+            self.close()
+            return dict.fromkeys(changes, False)
+
+    def print_stats(self):
+        cold = self.stats["cold_starts"]
+        warm = self.stats["warm_reuses"]
+        cold_avg = self.stats["cold_seconds"] / cold if cold else 0
+        warm_avg = self.stats["warm_seconds"] / warm if warm else 0
+        print(f"  - ℹ️  Сессия браузера: холодных запусков {cold} (в среднем {cold_avg:.1f} с), "
+              f"повторных использований {warm} (в среднем {warm_avg:.1f} с), "
+              f"перезапусков {self.stats['recycles']}, сбоев {self.stats['crashes']}, "
+              f"пиковая память {self.stats['peak_rss_mb']:.0f} МБ.")
+
+    def close(self):
+        if self.manager:
+            if self.manager.watchdog:
+                self.stats["peak_rss_mb"] = max(self.stats["peak_rss_mb"], self.manager.watchdog.peak_mb)
+            self.manager.close()
+        self.manager = None
+        self.uses = 0
+        self.started_at = None
+
+
+def _browser_login(config, session=None):
+    if session:
+        return session.acquire(config)
 
-def update_dns_records(config, new_ip):
     manager = TimeWebManager(config)
+    if manager.login():
+        return manager
+    manager.close()
+    return None
+
+
+def _get_http_backend(config, session=None):
+    # Второе значение — браузер, через который пришлось войти: он же служит запасным вариантом
+    backend = HttpBackend(config)
+    if backend.is_logged_in():
+        print("  - ✅ Сессия по куки действительна, браузер не нужен.")
+        return backend, None
+
+    print("  - ℹ️  Сессия по куки недействительна, выполняю вход через браузер...")
+    manager = _browser_login(config, session)
+    if manager:
+        backend.reload_cookies()
+        if backend.is_logged_in():
+            return backend, manager
+        print("  - 🟡 Не удалось работать без браузера, переключаюсь на Selenium.")
+    backend.close()
+    return None, manager
+
+
+def _release(manager, session):
+    if manager and not session:
+        manager.close()
+
+
+def update_dns_records(config, changes, session=None):
+    results = {}
+    manager = None
+    if config.get("dns_backend", "selenium") == "http":
+        backend, manager = _get_http_backend(config, session)
+        if not backend and not manager:
+            # Вход через браузер уже не удался, второй запуск браузера ничего не изменит
+            return dict.fromkeys(changes, False)
+        if backend:
+            results.update(backend.update_records(changes))
+            backend.close()
+            failed = [fqdn for fqdn, ok in results.items() if not ok and fqdn not in backend.rejected]
+            if not failed:
+                _release(manager, session)
+                return results
+            print(f"  - 🟡 Без браузера не обновлены: {', '.join(failed)}. Пробую через Selenium.")
+            changes = {fqdn: changes[fqdn] for fqdn in failed}
+            config = dict(config, domains=failed)
+
+    if session:
+        results.update(session.update_records(config, changes))
+        return results
+
+    manager = manager or TimeWebManager(config)
+    manager.config = config
     try:
-        if manager.login():
-            return manager.update_a_records(new_ip)
-        return False
+        if manager.logged_in or manager.login():
+            results.update(manager.update_records(changes))
+        else:
+            results.update(dict.fromkeys(changes, False))
     except Exception as e:
         print(f"  - ❌ Произошла критическая ошибка: {e}")
-        return False
+        results.update(dict.fromkeys(changes, False))
     finally:
         manager.close()
+    return results
 
 
-def get_dns_records(config):
-    manager = TimeWebManager(config)
+def get_dns_records(config, session=None):
+    records = {}
+    manager = None
+    if config.get("dns_backend", "selenium") == "http":
+        backend, manager = _get_http_backend(config, session)
+        if not backend and not manager:
+            return None
+        if backend:
+            try:
+                records.update(backend.get_a_records(config["domains"]))
+            except requests.RequestException as e:
+                print(f"  - 🟡 Не удалось получить записи без браузера: {e}")
+            finally:
+                backend.close()
+            # Таблицу может заполнять скрипт страницы: ненайденные записи перепроверяем в браузере
+            missing = [fqdn for fqdn in config["domains"]
+                       if records.get(fqdn, "не найдена") == "не найдена" and fqdn not in backend.rejected]
+            if not missing:
+                _release(manager, session)
+                return records
+            if records:
+                print(f"  - 🟡 Без браузера не найдены: {', '.join(missing)}. Проверяю через Selenium.")
+            config = dict(config, domains=missing)
+
+    browser_records = _get_browser_records(config, session, manager)
+    if browser_records is None:
+        return None
+    records.update(browser_records)
+    return records
+
+
+def _get_browser_records(config, session=None, manager=None):
+    if session:
+        manager = session.acquire(config)
+        try:
+            return manager.get_a_records() if manager else None
+        except WebDriverException as e:
+            print(f"  - ❌ Браузер перестал отвечать: {e}")
+            session.stats["crashes"] += 1
+            session.close()
+            return None
+
+    manager = manager or TimeWebManager(config)
+    manager.config = config
     try:
-        if manager.login():
+        if manager.logged_in or manager.login():
             return manager.get_a_records()
         return None
     except Exception as e:
@@ -250,7 +810,7 @@ def update_single_dns_record(config, fqdn, new_ip):
 
     try:
         if manager.login():
-            return manager.update_a_records(new_ip)
+            return all(manager.update_records({fqdn: new_ip}).values())
         return False
     except Exception as e:
         print(f"  - ❌ Произошла критическая ошибка: {e}")
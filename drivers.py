@@ -0,0 +1,79 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from utils import DATA_DIR, atomic_write_json
+
+DRIVERS_CACHE_FILE = os.path.join(DATA_DIR, 'drivers.json')
+
+CHROME_BINARY = "/usr/bin/google-chrome"
+FIREFOX_BINARY = "firefox"
+DRIVER_NAMES = {"chrome": "chromedriver", "firefox": "geckodriver"}
+
+
+def get_browser_version(browser):
+    binary = FIREFOX_BINARY if browser == "firefox" else CHROME_BINARY
+    try:
+        output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"\d+(\.\d+)+", output)
+    return match.group(0) if match else None
+
+
+def _load_cache():
+    if os.path.exists(DRIVERS_CACHE_FILE):
+        with open(DRIVERS_CACHE_FILE, 'r') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                pass
+    return {}
+
+
+def _save_cache(cache):
+    atomic_write_json(DRIVERS_CACHE_FILE, cache, indent=2)
+
+
+def _install_driver(browser):
+    if browser == "firefox":
+        from webdriver_manager.firefox import GeckoDriverManager
+        return GeckoDriverManager().install()
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+
+def clear_driver_cache():
+    if os.path.exists(DRIVERS_CACHE_FILE):
+        os.remove(DRIVERS_CACHE_FILE)
+
+
+def resolve_driver_path(browser, offline=False):
+    browser = "firefox" if browser == "firefox" else "chrome"
+    version = get_browser_version(browser)
+    cache = _load_cache()
+    entry = cache.get(browser)
+    cached_path = entry.get("driver_path") if entry else None
+    if cached_path and not os.path.exists(cached_path):
+        cached_path = None
+
+    if cached_path and entry.get("browser_version") == version:
+        return cached_path
+
+    if offline:
+        if cached_path:
+            print(f"  - 🟡 Версия браузера изменилась ({entry.get('browser_version')} -> {version}), "
+                  f"но включен офлайн-режим. Использую сохраненный драйвер.")
+            return cached_path
+        system_driver = shutil.which(DRIVER_NAMES[browser])
+        if system_driver:
+            return system_driver
+        raise RuntimeError(f"Драйвер {DRIVER_NAMES[browser]} не найден, а загрузка отключена (offline_drivers).")
+
+    print(f"  - Загружаю драйвер для {browser} {version or ''}...")
+    driver_path = _install_driver(browser)
+    cache[browser] = {"browser_version": version, "driver_path": driver_path}
+    _save_cache(cache)
+    return driver_path
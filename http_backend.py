@@ -0,0 +1,253 @@
+import threading
+from html.parser import HTMLParser
+
+import requests
+
+import metrics
+from utils import PANEL_URL, load_cookies, save_cookies, find_a_record, throttle_panel
+from zones import resolve_pages
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:139.0) Gecko/20100101 Firefox/139.0"
+UPDATE_RECORD_PATH = "/domains/dns-records/edit-record"
+
+# Результат проверки сохраненной сессии
+SESSION_VALID = "valid"
+SESSION_EXPIRED = "expired"
+SESSION_UNKNOWN = "unknown"
+
+
+class SessionExpired(requests.RequestException):
+    pass
+
+
+class DnsTableParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.csrf_token = None
+        self.login_form = False
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta" and attrs.get("name") == "csrf-token":
+            self.csrf_token = attrs.get("content")
+        elif tag == "input" and attrs.get("name") == "username":
+            self.login_form = True
+        elif tag == "tr":
+            self._row = {"id": attrs.get("data-id"), "cells": []}
+        elif tag == "td" and self._row is not None:
+            self._cell = []
+        elif tag == "button" and self._row is not None and "js-edit-record" in (attrs.get("class") or ""):
+            self._row["id"] = self._row["id"] or attrs.get("data-id") or attrs.get("data-record-id")
+
+    def handle_endtag(self, tag):
+        if tag == "td" and self._cell is not None:
+            self._row["cells"].append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            cells = self._row["cells"]
+            if len(cells) >= 3:
+                self.rows.append({"name": cells[0], "type": cells[1], "value": cells[2], "id": self._row["id"]})
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+class HttpBackend:
+
+    def __init__(self, config):
+        self.config = config
+        self.panel_url = config.get("panel_url", PANEL_URL)
+        self.update_path = config.get("http_update_path", UPDATE_RECORD_PATH)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        # Домены, которых нет в аккаунте: браузер их тоже отклонит, повторять через него незачем
+        self.rejected = set()
+        self.reload_cookies()
+
+    def reload_cookies(self):
+        self.session.cookies.clear()
+        for cookie in load_cookies(self.config.get("account")) or []:
+            self.session.cookies.set(cookie["name"], cookie["value"],
+                                     domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+
+    def save_cookies(self):
+        cookies = []
+        for cookie in self.session.cookies:
+            exported = {"name": cookie.name, "value": cookie.value, "path": cookie.path, "secure": cookie.secure}
+            if cookie.domain:
+                exported["domain"] = cookie.domain
+            if cookie.expires:
+                exported["expiry"] = cookie.expires
+            cookies.append(exported)
+        if cookies:
+            save_cookies(cookies, self.config.get("account"))
+
+    def session_state(self):
+        if not self.session.cookies:
+            return SESSION_EXPIRED
+        try:
+            response = self.session.get(f"{self.panel_url}/", timeout=10)
+        except requests.RequestException:
+            return SESSION_UNKNOWN
+        if 'name="username"' in response.text:
+            return SESSION_EXPIRED
+        if response.ok and 'href="/domains"' in response.text:
+            return SESSION_VALID
+        # Ни формы входа, ни ссылки на домены (например, меню рисует скрипт): по куки еще можно попробовать
+        return SESSION_UNKNOWN
+
+    def is_logged_in(self):
+        return self.session_state() == SESSION_VALID
+
+    def _fetch(self, url):
+        throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+        with metrics.phase("http_fetch"):
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+        parser = DnsTableParser()
+        parser.feed(response.text)
+        if parser.login_form:
+            raise SessionExpired(url)
+        return response.text, parser
+
+    def _fetch_table(self, url):
+        return self._fetch(url)[1]
+
+    def _fetch_listing(self):
+        return self._fetch(f"{self.panel_url}/domains")[0]
+
+    def resolve_pages(self, domains):
+        pages, rejected = resolve_pages(self.config, domains, self.panel_url, self._fetch_listing)
+        self.rejected.update(rejected)
+        return pages, rejected
+
+    def get_a_records(self, domains):
+        records = {}
+        print("\n  - Получаю текущие A-записи (без браузера)...")
+        pages, rejected = self.resolve_pages(domains)
+        records.update(dict.fromkeys(rejected, "не найдена"))
+        for url, fqdns in pages.items():
+            rows = self._fetch_table(url).rows
+            for fqdn in fqdns:
+                row = find_a_record(rows, fqdn)
+                if row:
+                    records[fqdn] = row["value"]
+                    print(f"  - Найдено: {fqdn} -> {row['value']}")
+                else:
+                    print(f"  - ❌ Не удалось найти A-запись для '{fqdn}'.")
+                    records[fqdn] = "не найдена"
+        return records
+
+    def update_single_record(self, fqdn, new_ip):
+        return self.update_records({fqdn: new_ip})[fqdn]
+
+    def update_records(self, changes):
+        pages, rejected = self.resolve_pages(list(changes))
+        results = dict.fromkeys(rejected, False)
+        for url, fqdns in pages.items():
+            try:
+                results.update(self._update_page(url, {fqdn: changes[fqdn] for fqdn in fqdns}))
+            except SessionExpired:
+                print("  - ❌ Сессия по куки истекла.")
+                results.update(dict.fromkeys(fqdns, False))
+            except requests.RequestException as e:
+                print(f"  - ❌ Ошибка при обновлении {', '.join(fqdns)}: {e}")
+                results.update(dict.fromkeys(fqdns, False))
+        return results
+
+    def _update_page(self, url, changes):
+        results = {}
+        saved = []
+        table = self._fetch_table(url)
+        headers = {"Referer": url, "X-Requested-With": "XMLHttpRequest"}
+        if table.csrf_token:
+            headers["X-CSRF-Token"] = table.csrf_token
+
+        for fqdn, new_ip in changes.items():
+            print(f"\n  - Обновление (без браузера): {fqdn}")
+            row = find_a_record(table.rows, fqdn)
+            if not row or not row["id"]:
+                print(f"  - ❌ Не удалось найти A-запись для '{fqdn}'.")
+                results[fqdn] = False
+                continue
+            if row["value"] == new_ip:
+                print(f"  - ℹ️  IP-адрес для {fqdn} уже {new_ip}. Пропускаю.")
+                results[fqdn] = True
+                continue
+
+            throttle_panel(self.panel_url, self.config.get("panel_min_interval_seconds", 0.5))
+            with metrics.phase("http_save", fqdn=fqdn):
+                response = self.session.post(f"{self.panel_url}{self.update_path}", headers=headers, timeout=10, data={
+                    "fqdn": fqdn,
+                    "id": row["id"],
+                    "type": "A",
+                    "value": new_ip,
+                })
+                response.raise_for_status()
+            saved.append(fqdn)
+
+        if saved:
+            # Одна повторная загрузка страницы подтверждает все сохраненные записи
+            rows = self._fetch_table(url).rows
+            for fqdn in saved:
+                row = find_a_record(rows, fqdn)
+                results[fqdn] = bool(row) and row["value"] == changes[fqdn]
+                if results[fqdn]:
+                    print(f"  - ✅ A-запись для {fqdn} обновлена на {changes[fqdn]}")
+                else:
+                    print(f"  - ❌ Панель не применила новое значение для '{fqdn}'.")
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+def probe_session(config):
+    backend = HttpBackend(config)
+    try:
+        return backend.session_state()
+    finally:
+        backend.close()
+
+
+class SessionKeepAlive:
+
+    def __init__(self, accounts, interval_seconds):
+        self.accounts = accounts
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="session-keepalive", daemon=True)
+        self._thread.start()
+
+    def refresh(self):
+        # Только продлевает живую сессию запросом; повторный вход остается за планировщиком с его паузами
+        for account in self.accounts:
+            backend = HttpBackend(account)
+            try:
+                state = backend.session_state()
+                if state == SESSION_VALID:
+                    backend.save_cookies()
+                elif state == SESSION_EXPIRED:
+                    print(f"ℹ️  Сессия {account.get('account') or account['timeweb_login']} истекла, "
+                          f"вход выполнится при следующем обновлении записей.")
+            finally:
+                backend.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"🟡 Не удалось обновить сессию в фоне: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -1,10 +1,32 @@
+import signal
 import sys
-import time
-from utils import load_config, manage_settings, get_current_ip, get_saved_ip, save_new_ip, clear_session
-from dns_updater import TimeWebManager, update_dns_records
 
+import change_queue
+import metrics
+from accounts import apply_ip, pending_domains, get_accounts_records, close_sessions
+from utils import (load_config, manage_settings, get_current_ip, clear_session, load_domain_state, update_domain_state,
+                   get_confirmed_value, get_accounts, get_all_domains)
 
-def run_update(force=False):
+
+def run_check():
+    config = load_config(setup_if_missing=False)
+    if not config:
+        return 2
+
+    current_ip = get_current_ip(config.get("ip_quorum", 1), config.get("ip_race_width", 2))
+    if not current_ip:
+        return 2
+
+    domains = get_all_domains(config)
+    pending = pending_domains(domains, load_domain_state(domains), current_ip)
+    if pending:
+        print(f"⚠️ Требуется обновление ({current_ip}): {', '.join(pending)}")
+        return 1
+    print(f"✅ Все записи актуальны ({current_ip}).")
+    return 0
+
+
+def run_update(force=False, sessions=None, current_ip=None, debounce_seconds=0):
     if force:
         print("▶️  Запуск принудительного обновления IP...")
     else:
@@ -13,57 +35,157 @@ def run_update(force=False):
     config = load_config()
     if not config:
         print("❌ Не удалось загрузить конфигурацию. Выход.")
-        return
+        return False
 
-    current_ip = get_current_ip()
+    current_ip = current_ip or get_current_ip(config.get("ip_quorum", 1), config.get("ip_race_width", 2))
     if not current_ip:
-        return
+        return False
 
-    saved_ip = get_saved_ip()
     print(f"Текущий IP: {current_ip}")
-    print(f"Сохраненный IP: {saved_ip or 'не найден'}")
+    results = apply_ip(config, current_ip, force=force, sessions=sessions, debounce_seconds=debounce_seconds)
+    if not results:
+        if change_queue.next_due_in(debounce_seconds) is None:
+            print("✅ IP-адрес не изменился. Обновление не требуется.")
+        return True
+
+    failed = [fqdn for fqdn, ok in results.items() if not ok]
+    if not failed:
+        print("\n✅ DNS записи успешно обновлены, новый IP сохранен.")
+        return True
+    print(f"\n❌ Не удалось обновить: {', '.join(failed)}. Они будут повторены при следующей проверке.")
+    return False
 
-    if current_ip == saved_ip and not force:
-        print("✅ IP-адрес не изменился. Обновление не требуется.")
-        return
 
-    if force and current_ip == saved_ip:
-        print("ℹ️  IP-адрес не изменился, но обновление будет выполнено принудительно.")
-    else:
-        print(f"⚠️ IP-адрес изменился! Старый: {saved_ip}, Новый: {current_ip}")
+def _dns_records(config, domains):
+    from dns_check import resolve_records
 
-    print("Начинаю обновление DNS записей (это может занять несколько минут)...")
-    success = update_dns_records(config, current_ip)
+    return {fqdn: ", ".join(values) or "не найдена"
+            for fqdn, values in resolve_records(config, domains).items() if values is not None}
 
-    if success:
-        save_new_ip(current_ip)
-        print("\n✅ DNS записи успешно обновлены, новый IP сохранен.")
-    else:
-        print("\n❌ Произошла ошибка при обновлении DNS записей. IP не был сохранен.")
+
+def run_verify(sessions=None):
+    print("▶️  Сверяю A-записи с сохраненным состоянием...")
+    config = load_config()
+    if not config:
+        print("❌ Не удалось загрузить конфигурацию. Выход.")
+        return False
+
+    domains = get_all_domains(config)
+    records = _dns_records(config, domains) if config.get("dns_precheck", True) else {}
+    missing = [fqdn for fqdn in domains if fqdn not in records]
+    if missing:
+        accounts = [dict(account, domains=[fqdn for fqdn in account["domains"] if fqdn in missing])
+                    for account in get_accounts(config)]
+        panel_records = get_accounts_records(config, [account for account in accounts if account["domains"]],
+                                             sessions=sessions)
+        if panel_records is None:
+            print("❌ Не удалось получить DNS-записи.")
+            return False
+        records.update(panel_records)
+
+    state = load_domain_state(domains)
+    mismatched = [fqdn for fqdn, value in records.items() if get_confirmed_value(state, fqdn) != value]
+    if not mismatched:
+        print("✅ Опубликованные записи совпадают с сохраненным состоянием.")
+        return True
+
+    for fqdn in mismatched:
+        print(f"⚠️ {fqdn}: опубликовано {records[fqdn]}, ожидалось {get_confirmed_value(state, fqdn) or 'не найден'}")
+
+    def invalidate(state):
+        # Пока шла проверка, другой процесс мог уже подтвердить опубликованное значение
+        for fqdn in mismatched:
+            if get_confirmed_value(state, fqdn) != records[fqdn]:
+                state.setdefault(fqdn, {"updated_at": None, "failures": 0})["value"] = None
+
+    update_domain_state(invalidate)
+    return run_update(sessions=sessions)
 
 
 def run_auto_mode():
+    from scheduler import Scheduler, Task, IpHysteresis
+
     print("--- Запуск в автоматическом режиме ---")
     config = load_config()
-    interval_minutes = config.get("check_interval_minutes", 30)
-    interval_seconds = interval_minutes * 60
+    sessions = {} if config.get("keep_browser_session") else None
+    hysteresis = IpHysteresis(config.get("ip_hysteresis_minutes", 10) * 60)
+
+    watcher = None
+    if config.get("netlink_watch"):
+        from netwatch import NetlinkWatcher
+        watcher = NetlinkWatcher(config.get("netlink_debounce_seconds", 5))
+        if not watcher.start():
+            watcher = None
+
+    keepalive = None
+    if config.get("session_keepalive_minutes"):
+        from http_backend import SessionKeepAlive
+        keepalive = SessionKeepAlive(get_accounts(config), config["session_keepalive_minutes"] * 60)
+        keepalive.start()
+
+    debounce = config.get("change_debounce_seconds", 60)
+    retry_base = config.get("retry_base_minutes", 1) * 60
+    retry_max = config.get("retry_max_minutes", 60) * 60
+
+    def poll_ip():
+        current_ip = get_current_ip(config.get("ip_quorum", 1), config.get("ip_race_width", 2))
+        if not current_ip:
+            return False
+        hold = hysteresis.observe(current_ip)
+        if hold:
+            print(f"🟡 IP-адрес часто меняется ({current_ip}), жду стабилизации {hold / 60:.1f} мин.")
+            poll_task.retry_in(hold)
+            return True
+        ok = run_update(sessions=sessions, current_ip=current_ip, debounce_seconds=debounce)
+        waiting = change_queue.next_due_in(debounce)
+        if waiting is not None:
+            poll_task.retry_in(waiting)
+        print_session_stats()
+        return ok
+
+    def verify_records():
+        ok = run_verify(sessions=sessions)
+        print_session_stats()
+        return ok
+
+    def print_session_stats():
+        for session in (sessions or {}).values():
+            session.print_stats()
+
+    poll_task = Task("ip_poll", poll_ip, config.get("check_interval_minutes", 30) * 60, retry_base, retry_max)
+    verify_task = Task("dns_verify", verify_records, config.get("verify_interval_minutes", 720) * 60,
+                       retry_base, retry_max)
+    verify_task.next_run += verify_task.interval_seconds
+    scheduler = Scheduler([poll_task, verify_task], watcher=watcher, trigger_task="ip_poll")
 
-    while True:
-        try:
-            run_update()
-            print(f"\n--- Проверка завершена. Следующая проверка через {interval_minutes} минут. ---")
-            time.sleep(interval_seconds)
-        except KeyboardInterrupt:
-            print("\nВыход из автоматического режима.")
-            break
-        except Exception as e:
-            print(f"\n❌ Произошла критическая ошибка в цикле: {e}")
-            print(f"Повторная попытка через {interval_minutes} минут...")
-            time.sleep(interval_seconds)
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\nВыход из автоматического режима.")
+    finally:
+        close_sessions(sessions)
+        if keepalive:
+            keepalive.stop()
+        if watcher:
+            watcher.stop()
 
 
 def manual_edit_menu():
+    from dns_updater import TimeWebManager
+
     config = load_config()
+    accounts = get_accounts(config)
+    if len(accounts) > 1:
+        for i, account in enumerate(accounts):
+            print(f"{i + 1}. {account['account']} ({', '.join(account['domains'])})")
+        try:
+            choice = int(input("Выберите аккаунт (введите номер): "))
+        except ValueError:
+            choice = 0
+        if not 1 <= choice <= len(accounts):
+            print("❌ Неверный номер. Возврат в главное меню.")
+            return
+        config = accounts[choice - 1]
     manager = TimeWebManager(config)
 
     try:
@@ -78,17 +200,31 @@ def manual_edit_menu():
             print("❌ Не удалось получить DNS-записи. Проверьте лог ошибок выше.")
             return
 
+        staged = {}
         while True:
             print("\n--- Текущие A-записи (активная сессия) ---")
             domain_list = list(records.keys())
             for i, domain in enumerate(domain_list):
                 ip = records.get(domain, "неизвестно")
-                print(f"{i + 1}. {domain} -> {ip}")
+                if domain in staged:
+                    print(f"{i + 1}. {domain} -> {ip} (в очереди: {staged[domain]})")
+                else:
+                    print(f"{i + 1}. {domain} -> {ip}")
+            if staged:
+                print(f"s. Применить изменения из очереди ({len(staged)})")
             print("0. Назад в главное меню (сессия закроется)")
 
+            choice = input("\nВыберите домен для редактирования (введите номер) или 0 для выхода: ").strip().lower()
+            if choice == 's' and staged:
+                apply_staged(manager, staged, records)
+                input("Нажмите Enter, чтобы продолжить...")
+                continue
+
             try:
-                choice = int(input("\nВыберите домен для редактирования (введите номер) или 0 для выхода: "))
+                choice = int(choice)
                 if choice == 0:
+                    if staged and input(f"Применить {len(staged)} изм. из очереди перед выходом? (y/n): ").lower() == 'y':
+                        apply_staged(manager, staged, records)
                     break
 
                 if 1 <= choice <= len(domain_list):
@@ -98,17 +234,9 @@ def manual_edit_menu():
                         print("❌ IP-адрес не может быть пустым. Отмена.")
                         continue
 
-                    print(f"\n▶️  Обновляю IP для {selected_domain} на {new_ip}...")
-
-                    success = manager.update_single_record(selected_domain, new_ip)
-
-                    if success:
-                        print(f"✅ Запись для {selected_domain} успешно обновлена.")
-                        records[selected_domain] = new_ip
-                    else:
-                        print(f"❌ Не удалось обновить запись для {selected_domain}.")
-
-                    input("Нажмите Enter, чтобы продолжить...")
+                    staged[selected_domain] = new_ip
+                    print(f"ℹ️  {selected_domain} -> {new_ip} добавлено в очередь. "
+                          f"Записи одной страницы DNS сохранятся за один переход.")
 
                 else:
                     print("❌ Неверный номер. Пожалуйста, выберите из списка.")
@@ -120,6 +248,27 @@ def manual_edit_menu():
         manager.close()
 
 
+def apply_staged(manager, staged, records):
+    print(f"\n▶️  Применяю изменения: {len(staged)}...")
+    results = manager.update_records(staged)
+    for fqdn, success in results.items():
+        if success:
+            print(f"✅ Запись для {fqdn} успешно обновлена.")
+            records[fqdn] = staged.pop(fqdn)
+        else:
+            print(f"❌ Не удалось обновить запись для {fqdn}, она осталась в очереди.")
+
+
+def dns_view_menu():
+    config = load_config()
+    if not config:
+        return
+    print("\n▶️  Запрашиваю A-записи у NS-серверов...")
+    records = _dns_records(config, get_all_domains(config))
+    for fqdn in get_all_domains(config):
+        print(f"{fqdn} -> {records.get(fqdn, 'нет ответа')}")
+
+
 def main_menu():
     while True:
         print("\n--- Меню Timeweb DDNS ---")
@@ -128,7 +277,8 @@ def main_menu():
         print("3. Посмотреть/изменить A-записи вручную")
         print("4. Изменить настройки")
         print("5. Сбросить сессию (для новой авторизации)")
-        print("6. Выход")
+        print("6. Посмотреть A-записи через DNS (без входа в панель)")
+        print("7. Выход")
 
         choice = input("Выберите действие: ")
 
@@ -143,6 +293,8 @@ def main_menu():
         elif choice == '5':
             clear_session()
         elif choice == '6':
+            dns_view_menu()
+        elif choice == '7':
             print("Выход.")
             break
         else:
@@ -150,13 +302,31 @@ def main_menu():
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
-        if command == 'auto':
-            run_auto_mode()
-        elif command == 'force-update':
-            run_update(force=True)
+    # docker stop шлет SIGTERM: выходим через sys.exit, чтобы закрылись браузеры
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    exit_code = 0
+    try:
+        from browser_watchdog import sweep_orphans
+        sweep_orphans()
+        if len(sys.argv) > 1:
+            command = sys.argv[1]
+            if command in ('auto', 'serve'):
+                metrics.enable_textfile()
+            if command == 'auto':
+                run_auto_mode()
+            elif command == 'force-update':
+                run_update(force=True)
+            elif command == 'check':
+                exit_code = run_check()
+            elif command == 'serve':
+                from server import run_server
+                config = load_config()
+                if config:
+                    run_server(config)
+            else:
+                print(f"Неизвестная команда: {command}")
         else:
-            print(f"Неизвестная команда: {command}")
-    else:
-        main_menu()
\ No newline at end of file
+            main_menu()
+    finally:
+        metrics.flush()
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,149 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_NAME = "timeweb_ddns_phase_duration_seconds"
+FAILURES_NAME = "timeweb_ddns_phase_failures_total"
+GAUGE_PREFIX = "timeweb_ddns_"
+RECENT_SIZE = 200
+
+_histograms = {}
+_failures = {}
+_gauges = {}
+_recent = deque(maxlen=RECENT_SIZE)
+_lock = threading.Lock()
+_settings = {"textfile": None, "textfile_enabled": False, "json_log": False}
+_server = None
+
+
+def configure(config, data_dir):
+    global _server
+    _settings["json_log"] = config.get("metrics_json_log", False)
+    _settings["textfile"] = os.path.join(data_dir, "timeweb_ddns.prom") if config.get("metrics_textfile", True) else None
+
+    port = config.get("metrics_port", 0)
+    if port and _server is None:
+        _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"ℹ️  Метрики доступны на http://127.0.0.1:{port}/metrics")
+
+
+def enable_textfile():
+    # Файл пишут только долгоживущие режимы: короткий запуск (check, меню) затер бы накопленные счетчики
+    _settings["textfile_enabled"] = True
+
+
+def observe(phase_name, seconds, ok=True, **labels):
+    key = (phase_name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        if not ok:
+            _failures[key] = _failures.get(key, 0) + 1
+
+    line = {"ts": round(time.time(), 3), "phase": phase_name, "duration": round(seconds, 4), "ok": ok, **labels}
+    _recent.append(line)
+    if _settings["json_log"]:
+        print(json.dumps(line, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def recent(limit=50):
+    with _lock:
+        return list(_recent)[-limit:]
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+@contextmanager
+def phase(phase_name, **labels):
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(phase_name, time.monotonic() - started, ok, **labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render():
+    lines = [
+        f"# HELP {METRIC_NAME} Длительность фаз работы Timeweb DDNS.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _lock:
+        for (phase_name, labels), histogram in sorted(_histograms.items()):
+            base = (("phase", phase_name),) + labels
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f"{METRIC_NAME}_bucket{_format_labels(base, le=bound)} {count}")
+            lines.append(f"{METRIC_NAME}_bucket{_format_labels(base, le='+Inf')} {histogram['count']}")
+            lines.append(f"{METRIC_NAME}_sum{_format_labels(base)} {histogram['sum']:.6f}")
+            lines.append(f"{METRIC_NAME}_count{_format_labels(base)} {histogram['count']}")
+
+        lines.append(f"# HELP {FAILURES_NAME} Количество неудачных фаз.")
+        lines.append(f"# TYPE {FAILURES_NAME} counter")
+        for (phase_name, labels), count in sorted(_failures.items()):
+            lines.append(f"{FAILURES_NAME}{_format_labels((('phase', phase_name),) + labels)} {count}")
+
+        for name in sorted({name for name, _ in _gauges}):
+            lines.append(f"# TYPE {GAUGE_PREFIX}{name} gauge")
+            for (gauge_name, labels), value in sorted(_gauges.items()):
+                if gauge_name == name:
+                    lines.append(f"{GAUGE_PREFIX}{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    path = _settings["textfile"]
+    if not path or not _settings["textfile_enabled"]:
+        return
+    directory = os.path.dirname(path) or '.'
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(render())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"🟡 Не удалось записать метрики в {path}: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,227 @@
+import html
+import json
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from utils import dns_page_url
+
+SESSION_COOKIE = "mock_session"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="csrf-token" content="{csrf}">
+<title>Mock Timeweb</title>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+LOGIN_BODY = """
+<form method="post" action="/login">
+  <input type="text" name="username">
+  <input type="password" name="password">
+  <button type="submit">Войти</button>
+</form>
+"""
+
+NAV_BODY = """<nav><a href="/domains">Домены и поддомены</a></nav>"""
+
+DNS_TABLE_SCRIPT = """
+<script>
+document.addEventListener('click', function (event) {
+  var edit = event.target.closest('button.js-edit-record');
+  if (!edit) {
+    return;
+  }
+  var row = edit.closest('tr');
+  var modal = document.createElement('div');
+  modal.className = 'k-window';
+  modal.innerHTML = '<div class="k-window-title">Редактировать A-запись</div>' +
+    '<input type="text" name="value">' +
+    '<button class="js-confirm">Сохранить</button>' +
+    '<button class="js-confirm-not">Отмена</button>';
+  modal.querySelector('input').value = row.children[2].textContent.trim();
+  document.body.appendChild(modal);
+
+  modal.querySelector('.js-confirm-not').addEventListener('click', function () {
+    modal.remove();
+  });
+  modal.querySelector('.js-confirm').addEventListener('click', function () {
+    var value = modal.querySelector('input').value;
+    var form = new URLSearchParams({fqdn: row.children[0].textContent.trim(), id: row.dataset.id, type: 'A', value: value});
+    fetch('/domains/dns-records/edit-record', {
+      method: 'POST',
+      headers: {'X-CSRF-Token': document.querySelector('meta[name=csrf-token]').content},
+      body: form
+    }).then(function (response) {
+      if (response.ok) {
+        row.children[2].textContent = value;
+        modal.remove();
+      }
+    });
+  });
+});
+</script>
+"""
+
+
+class MockPanel:
+
+    def __init__(self, domains, login="user", password="password", latency=0.0, initial_ip="192.0.2.1"):
+        self.login = login
+        self.password = password
+        self.latency = latency
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.records = {}
+        self.requests_count = 0
+        for i, fqdn in enumerate(domains):
+            self.records[fqdn] = [
+                {"id": str(i * 2 + 1), "name": fqdn, "type": "A", "value": initial_ip},
+                {"id": str(i * 2 + 2), "name": fqdn, "type": "TXT", "value": "v=spf1 -all"},
+            ]
+        self.server = None
+
+    def start(self, host="127.0.0.1", port=0):
+        panel = self
+
+        class Handler(_MockPanelHandler):
+            pass
+
+        Handler.panel = panel
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="mock-panel", daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def get_value(self, fqdn):
+        for record in self.records.get(fqdn, []):
+            if record["type"] == "A":
+                return record["value"]
+        return None
+
+
+class _MockPanelHandler(BaseHTTPRequestHandler):
+    panel = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE and value in self.panel.sessions:
+                return value
+        return None
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _page(self, body, session=None):
+        csrf = self.panel.sessions.get(session, "")
+        self._send(200, PAGE_TEMPLATE.format(csrf=csrf, body=body))
+
+    def _delay(self):
+        with self.panel.lock:
+            self.panel.requests_count += 1
+        if self.panel.latency:
+            time.sleep(self.panel.latency)
+
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        session = self._session()
+        if not session:
+            self._page(LOGIN_BODY)
+            return
+
+        if url.path in ("/", "/domains"):
+            items = "".join(f'<li><a href="{html.escape(dns_page_url(fqdn, ""))}">{html.escape(fqdn)}</a></li>'
+                            for fqdn in sorted(self.panel.records))
+            self._page(f"{NAV_BODY}<ul>{items}</ul>", session)
+        elif url.path in ("/domains/dns-records/domain", "/domains/dns-records/subdomain"):
+            query = parse_qs(url.query)
+            zone = query.get("fqdn", [""])[0]
+            sub = query.get("sub", [""])[0]
+            name = f"{sub}.{zone}" if sub else zone
+            rows = "".join(
+                f'<tr data-id="{record["id"]}"><td>{html.escape(record["name"])}</td><td>{record["type"]}</td>'
+                f'<td>{html.escape(record["value"])}</td>'
+                f'<td><button class="js-edit-record" data-id="{record["id"]}">Изменить</button></td></tr>'
+                for record in self.panel.records.get(name, []))
+            self._page(f"{NAV_BODY}<table><tr><th>Имя</th><th>Тип</th><th>Значение</th><th></th></tr>{rows}</table>"
+                       f"{DNS_TABLE_SCRIPT}", session)
+        else:
+            self._send(404, "not found", "text/plain")
+
+    def do_POST(self):
+        self._delay()
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        url = urlparse(self.path)
+
+        if url.path == "/login":
+            if form.get("username") == self.panel.login and form.get("password") == self.panel.password:
+                session = secrets.token_hex(16)
+                self.panel.sessions[session] = secrets.token_hex(16)
+                self._send(302, "", headers={"Location": "/", "Set-Cookie": f"{SESSION_COOKIE}={session}; Path=/"})
+            else:
+                self._page(LOGIN_BODY)
+            return
+
+        session = self._session()
+        if not session or self.headers.get("X-CSRF-Token") != self.panel.sessions[session]:
+            self._send(403, json.dumps({"error": "forbidden"}), "application/json")
+            return
+
+        if url.path == "/domains/dns-records/edit-record":
+            with self.panel.lock:
+                for record in self.panel.records.get(form.get("fqdn"), []):
+                    if record["id"] == form.get("id") and record["type"] == form.get("type"):
+                        record["value"] = form.get("value", "")
+                        self._send(200, json.dumps({"result": "ok"}), "application/json")
+                        return
+            self._send(404, json.dumps({"error": "record not found"}), "application/json")
+        else:
+            self._send(404, json.dumps({"error": "not found"}), "application/json")
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    domains = ["example.test"] + [f"sub{i}.example.test" for i in range(1, count)]
+    panel = MockPanel(domains, latency=latency)
+    panel.start(port=port)
+    print(f"Mock-панель запущена на {panel.url} (логин: {panel.login}, пароль: {panel.password})")
+    print(f"Домены: {', '.join(domains)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        panel.stop()
@@ -0,0 +1,82 @@
+import socket
+import struct
+import threading
+import time
+
+NETLINK_ROUTE = 0
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+WATCHED_MESSAGES = {RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTM_DELROUTE}
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+
+
+class NetlinkWatcher:
+
+    def __init__(self, debounce_seconds=5):
+        self.debounce_seconds = debounce_seconds
+        self._changed = threading.Event()
+        self._last_event = 0.0
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        if not hasattr(socket, "AF_NETLINK"):
+            print("🟡 Netlink недоступен на этой платформе, используется только периодическая проверка.")
+            return False
+        try:
+            self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self._socket.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+        except OSError as e:
+            print(f"🟡 Не удалось подписаться на события сети: {e}")
+            self._socket = None
+            return False
+
+        self._thread = threading.Thread(target=self._listen, name="netlink-watcher", daemon=True)
+        self._thread.start()
+        print("ℹ️  Слежу за изменениями адресов и маршрутов (netlink).")
+        return True
+
+    def _listen(self):
+        while self._socket:
+            try:
+                data = self._socket.recv(65535)
+            except OSError:
+                return
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+                if msg_type in WATCHED_MESSAGES:
+                    self._last_event = time.monotonic()
+                    self._changed.set()
+                if length < NLMSG_HEADER.size:
+                    break
+                offset += (length + 3) & ~3
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        if not self._changed.wait(max(0.0, deadline - time.monotonic())):
+            return False
+
+        # Ждем, пока события утихнут (переподключение PPPoE дает серию сообщений),
+        # но не дольше исходного срока: при непрерывных событиях планировщик не должен зависнуть
+        limit = deadline + self.debounce_seconds
+        while True:
+            self._changed.clear()
+            now = time.monotonic()
+            quiet_left = self._last_event + self.debounce_seconds - now
+            if quiet_left <= 0 or now >= limit:
+                return True
+            time.sleep(min(quiet_left, limit - now))
+
+    def stop(self):
+        sock, self._socket = self._socket, None
+        if sock:
+            sock.close()
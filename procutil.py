@@ -0,0 +1,122 @@
+import os
+import signal
+import threading
+import time
+
+KILL_GRACE_SECONDS = 3
+
+
+def _stat_fields(pid):
+    with open(f'/proc/{pid}/stat', 'r') as f:
+        stat = f.read()
+    # Имя процесса в скобках может содержать пробелы
+    return stat.rsplit(')', 1)[1].split()
+
+
+def _children_map():
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid = int(_stat_fields(entry)[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def process_start_time(pid):
+    try:
+        fields = _stat_fields(pid)
+    except (OSError, IndexError):
+        return None
+    # Зомби уже завершился, его осталось только дождаться
+    if fields[0] == 'Z':
+        return None
+    return int(fields[19])
+
+
+def _reap(pids):
+    for pid in pids:
+        try:
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+
+
+def kill_tree(pid, grace_seconds=KILL_GRACE_SECONDS):
+    pids = process_tree(pid)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for target in pids:
+            try:
+                os.kill(target, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        deadline = time.monotonic() + grace_seconds
+        while pids and time.monotonic() < deadline:
+            _reap(pids)
+            pids = [target for target in pids if process_start_time(target) is not None]
+            if pids:
+                time.sleep(0.1)
+        if not pids:
+            return True
+    return False
+
+
+def process_tree(pid):
+    if not os.path.isdir('/proc'):
+        return [pid]
+    children = _children_map()
+    tree = []
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def process_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+def tree_rss_mb(pid):
+    return sum(process_rss_mb(child) for child in process_tree(pid))
+
+
+class RssSampler:
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak_mb = max(self.peak_mb, tree_rss_mb(self.pid))
+        return self.peak_mb
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return False
@@ -0,0 +1,120 @@
+import os
+import random
+import time
+
+import metrics
+from utils import DATA_DIR, atomic_write_json
+
+SCHEDULER_FILE = os.path.join(DATA_DIR, 'scheduler.json')
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(timestamp)) if timestamp else None
+
+
+class Task:
+
+    def __init__(self, name, func, interval_seconds, retry_base_seconds=60, retry_max_seconds=3600):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.next_run = time.time()
+        self.last_run = None
+        self.last_duration = None
+        self.last_ok = None
+        self.failures = 0
+        self._retry_in = None
+
+    def retry_in(self, seconds):
+        self._retry_in = seconds
+
+    def backoff_delay(self):
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (self.failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def run(self):
+        self._retry_in = None
+        self.last_run = time.time()
+        started = time.monotonic()
+        try:
+            ok = bool(self.func())
+        except Exception as e:
+            print(f"\n❌ Произошла критическая ошибка в задаче '{self.name}': {e}")
+            ok = False
+        self.last_duration = time.monotonic() - started
+        self.last_ok = ok
+        metrics.observe(f"task_{self.name}", self.last_duration, ok)
+
+        if ok:
+            self.failures = 0
+            delay = self.interval_seconds
+        else:
+            self.failures += 1
+            delay = self.backoff_delay()
+        if self._retry_in is not None:
+            delay = min(delay, self._retry_in)
+        self.next_run = time.time() + delay
+
+    def status(self):
+        return {
+            "next_run": _format_time(self.next_run),
+            "last_run": _format_time(self.last_run),
+            "last_duration_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_ok": self.last_ok,
+            "failures": self.failures,
+        }
+
+
+class IpHysteresis:
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.last_ip = None
+        self.changes = []
+
+    def observe(self, ip):
+        now = time.time()
+        if self.last_ip is not None and ip != self.last_ip:
+            self.changes.append(now)
+        self.last_ip = ip
+        self.changes = [t for t in self.changes if now - t < self.window_seconds]
+
+        # Первая смена применяется сразу, при повторных ждем, пока IP простоит целое окно
+        if len(self.changes) <= 1:
+            return 0
+        return max(0, self.changes[-1] + self.window_seconds - now)
+
+
+class Scheduler:
+
+    def __init__(self, tasks, watcher=None, trigger_task=None):
+        self.tasks = {task.name: task for task in tasks}
+        self.watcher = watcher
+        self.trigger_task = trigger_task
+
+    def trigger(self, name):
+        self.tasks[name].next_run = time.time()
+
+    def export_status(self):
+        atomic_write_json(SCHEDULER_FILE, {name: task.status() for name, task in self.tasks.items()}, indent=2)
+
+    def run_forever(self):
+        while True:
+            for task in sorted(self.tasks.values(), key=lambda t: t.next_run):
+                if task.next_run <= time.time():
+                    task.run()
+            self.export_status()
+            metrics.flush()
+
+            next_task = min(self.tasks.values(), key=lambda t: t.next_run)
+            delay = max(0.0, next_task.next_run - time.time())
+            print(f"\n--- Следующая задача: '{next_task.name}' через {delay / 60:.1f} мин. ---")
+
+            if self.watcher and self.trigger_task:
+                if self.watcher.wait(delay):
+                    print("\n--- Обнаружено изменение сетевых адресов, проверяю IP. ---")
+                    self.trigger(self.trigger_task)
+            else:
+                time.sleep(delay)
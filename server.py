@@ -0,0 +1,277 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import metrics
+from accounts import apply_ip, get_accounts_records, close_sessions
+from utils import load_config, get_current_ip, parse_ip, get_accounts, get_all_domains, load_domain_state, \
+    get_ip_history
+
+JOB_TIMEOUT_SECONDS = 600
+
+
+class Job:
+
+    def __init__(self, kind, ip=None, domains=None, force=False):
+        self.kind = kind
+        self.ip = ip
+        self.domains = domains
+        self.force = force
+        self.created_at = time.time()
+        self.result = None
+        self.done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+
+class UpdateService:
+
+    def __init__(self, config):
+        self.coalesce_seconds = config.get("serve_coalesce_seconds", 1)
+        self.sessions = {}
+        self.jobs = queue.Queue()
+        self.status = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "busy": False,
+            "last_ip": None,
+            "last_run": None,
+            "last_duration_seconds": None,
+            "last_results": None,
+            "jobs_processed": 0,
+            "batches_processed": 0,
+        }
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="update-service", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.jobs.put(None)
+        if self._thread:
+            self._thread.join(timeout=30)
+        close_sessions(self.sessions)
+
+    def submit(self, job):
+        self.jobs.put(job)
+        return job
+
+    def _next_batch(self):
+        first = self.jobs.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self.jobs.get(timeout=max(0.0, remaining)) if remaining > 0 else self.jobs.get_nowait()
+            except queue.Empty:
+                return batch
+            if job is None:
+                self.jobs.put(None)
+                return batch
+            batch.append(job)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.status["busy"] = True
+            started = time.monotonic()
+            try:
+                config = load_config(setup_if_missing=False)
+                updates = [job for job in batch if job.kind == "update"]
+                reads = [job for job in batch if job.kind == "records"]
+                if not config:
+                    for job in batch:
+                        job.finish({"error": "не удалось загрузить конфигурацию"})
+                    continue
+                if updates:
+                    self._process_updates(config, updates)
+                if reads:
+                    records = get_accounts_records(config, get_accounts(config), sessions=self.sessions)
+                    for job in reads:
+                        job.finish({"records": records} if records is not None else
+                                   {"error": "не удалось получить DNS-записи"})
+            except Exception as e:
+                print(f"❌ Ошибка при обработке запросов: {e}")
+                for job in batch:
+                    if not job.done.is_set():
+                        job.finish({"error": str(e)})
+            finally:
+                self.status["busy"] = False
+                self.status["jobs_processed"] += len(batch)
+                self.status["batches_processed"] += 1
+                self.status["last_duration_seconds"] = round(time.monotonic() - started, 3)
+                self.status["last_run"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+                metrics.flush()
+
+    def _process_updates(self, config, jobs):
+        all_domains = get_all_domains(config)
+        detected_ip = None
+        desired = {}
+        for job in jobs:
+            ip = job.ip
+            if not ip:
+                if detected_ip is None:
+                    detected_ip = get_current_ip(config.get("ip_quorum", 1), config.get("ip_race_width", 2)) or ""
+                ip = detected_ip
+            for fqdn in job.domains or all_domains:
+                previous_ip, previous_force = desired.get(fqdn, (None, False))
+                desired[fqdn] = (ip, job.force or (previous_force and previous_ip == ip))
+
+        groups = {}
+        for fqdn, (ip, forced) in desired.items():
+            if ip:
+                groups.setdefault((ip, forced), []).append(fqdn)
+
+        if len(jobs) > 1:
+            print(f"ℹ️  Объединено запросов: {len(jobs)}, записей к проверке: {len(desired)}.")
+        results = {}
+        for (ip, forced), fqdns in groups.items():
+            results.update(apply_ip(config, ip, domains=fqdns, force=forced, sessions=self.sessions))
+            self.status["last_ip"] = ip
+        self.status["last_results"] = results
+
+        for job in jobs:
+            outcome = {}
+            for fqdn in job.domains or all_domains:
+                ip = desired[fqdn][0]
+                if not ip:
+                    outcome[fqdn] = "failed"
+                elif job.ip and job.ip != ip:
+                    outcome[fqdn] = "superseded"
+                elif fqdn not in results:
+                    outcome[fqdn] = "unchanged"
+                else:
+                    outcome[fqdn] = "updated" if results[fqdn] else "failed"
+            job.finish({"ip": job.ip or detected_ip or None, "results": outcome})
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    service = None
+    port = None
+    token = ""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _wait(self, job, wait=True):
+        if not wait:
+            self._send_json(202, {"queued": True})
+        elif job.done.wait(JOB_TIMEOUT_SECONDS):
+            self._send_json(500 if "error" in job.result else 200, job.result)
+        else:
+            self._send_json(504, {"error": "превышено время ожидания", "queued": True})
+
+    def _authorized(self):
+        # Чужой Host означает DNS rebinding: страница из браузера обращается к нам под своим именем
+        if self.headers.get("Host") not in (f"127.0.0.1:{self.port}", f"localhost:{self.port}"):
+            self._send_json(403, {"error": "недопустимый заголовок Host"})
+            return False
+        if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+            self._send_json(401, {"error": "нужен заголовок Authorization: Bearer <serve_token>"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = urlparse(self.path).path
+        if path == "/status":
+            config = load_config(setup_if_missing=False) or {}
+            domains = get_all_domains(config) if config else []
+            self._send_json(200, dict(
+                self.service.status,
+                queue_length=self.service.jobs.qsize(),
+                domains=load_domain_state(domains),
+                ip_history=get_ip_history(),
+                browser_sessions={str(name): session.stats for name, session in self.service.sessions.items()},
+            ))
+        elif path == "/records":
+            self._wait(self.service.submit(Job("records")))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path != "/update":
+            self._send_json(404, {"error": "not found"})
+            return
+        # Простой кросс-сайтовый POST из браузера не может прислать application/json без preflight,
+        # а на preflight сервер не отвечает
+        if self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            self._send_json(415, {"error": "нужен заголовок Content-Type: application/json"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {"error": "тело запроса должно быть JSON"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "тело запроса должно быть JSON-объектом"})
+            return
+
+        ip = payload.get("ip")
+        if ip is not None:
+            # В очередь идет нормализованный адрес, без пробелов и лишних нулей
+            ip = parse_ip(str(ip))
+            if not ip:
+                self._send_json(400, {"error": f"некорректный IPv4-адрес: {payload['ip']}"})
+                return
+
+        domains = payload.get("domains")
+        if domains is not None:
+            if not isinstance(domains, list) or not all(isinstance(fqdn, str) for fqdn in domains):
+                self._send_json(400, {"error": "domains должен быть списком строк"})
+                return
+            config = load_config(setup_if_missing=False) or {}
+            unknown = sorted(set(domains) - set(get_all_domains(config) if config else []))
+            if unknown:
+                self._send_json(400, {"error": f"домены не настроены: {', '.join(unknown)}"})
+                return
+
+        job = self.service.submit(Job("update", ip=ip, domains=domains, force=bool(payload.get("force"))))
+        self._wait(job, wait=payload.get("wait", True))
+
+
+def run_server(config):
+    service = UpdateService(config)
+    service.start()
+
+    class Handler(ControlHandler):
+        pass
+
+    Handler.service = service
+    port = config.get("serve_port", 8765)
+    Handler.port = port
+    Handler.token = config.get("serve_token", "")
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"--- Запуск в режиме сервиса: http://127.0.0.1:{port} ---")
+    print("  POST /update (Content-Type: application/json) {\"ip\": \"1.2.3.4\", \"domains\": [...]}, "
+          "GET /records, GET /status")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nОстановка сервиса.")
+    finally:
+        server.server_close()
+        service.stop()
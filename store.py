@@ -0,0 +1,272 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+BUSY_TIMEOUT_SECONDS = 30
+MIGRATED_SUFFIX = '.migrated'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS config (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL,
+    source_mtime REAL
+);
+CREATE TABLE IF NOT EXISTS cookies (
+    account TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS domain_state (
+    fqdn TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    failed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS pending_changes (
+    fqdn TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ip_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ip TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration_seconds REAL,
+    updated INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ip_history_started_at ON ip_history (started_at);
+CREATE TABLE IF NOT EXISTS browser_processes (
+    pid INTEGER PRIMARY KEY,
+    start_time INTEGER,
+    owner_pid INTEGER NOT NULL,
+    owner_start_time INTEGER,
+    registered_at REAL NOT NULL
+);
+"""
+
+
+class Store:
+
+    def __init__(self, path, data_dir):
+        self.path = path
+        self.data_dir = data_dir
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL: читатели не блокируют писателя, а обрыв посреди записи не портит базу
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.depth = 0
+            self._local.migrating = False
+        if not self._ready and not self._local.migrating:
+            with self._setup_lock:
+                if not self._ready:
+                    self._local.migrating = True
+                    try:
+                        conn.executescript(SCHEMA)
+                        self._migrate_json(conn)
+                    finally:
+                        self._local.migrating = False
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        # BEGIN IMMEDIATE сразу берет блокировку записи, поэтому меню и режим auto
+        # не прочитают одно и то же состояние, чтобы затем перезаписать друг друга
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def _migrate_json(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                conn.execute("COMMIT")
+                return
+
+            migrated = []
+            for name in sorted(os.listdir(self.data_dir)) if os.path.isdir(self.data_dir) else []:
+                path = os.path.join(self.data_dir, name)
+                if name == 'state.json':
+                    state = _read_json(path)
+                    if isinstance(state, dict):
+                        self.put_domain_state(state)
+                        migrated.append(path)
+                elif name == 'pending.json':
+                    pending = _read_json(path)
+                    if isinstance(pending, dict):
+                        self.replace_pending(pending)
+                        migrated.append(path)
+                elif name == 'cookies.json' or (name.startswith('cookies_') and name.endswith('.json')):
+                    cookies = _read_json(path)
+                    if isinstance(cookies, list):
+                        # Ключ совпадает с экранированным именем аккаунта из utils.cookies_key()
+                        account = name[len('cookies_'):-len('.json')] if name != 'cookies.json' else ''
+                        self.put_cookies(account, cookies)
+                        migrated.append(path)
+                elif name == 'ip.txt':
+                    with open(path, 'r') as f:
+                        legacy_ip = f.read().strip()
+                    if legacy_ip:
+                        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_ip', ?)", (legacy_ip,))
+                    migrated.append(path)
+
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                         (time.strftime("%Y-%m-%dT%H:%M:%S%z"),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+        for path in migrated:
+            os.replace(path, path + MIGRATED_SUFFIX)
+            print(f"ℹ️  {os.path.basename(path)} перенесен в {os.path.basename(self.path)}.")
+
+    def get_meta(self, key):
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def put_meta(self, key, value):
+        self.connection().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def delete_meta(self, key):
+        self.connection().execute("DELETE FROM meta WHERE key = ?", (key,))
+
+    def get_config(self):
+        row = self.connection().execute("SELECT data, source_mtime FROM config WHERE id = 1").fetchone()
+        if not row:
+            return None, None
+        return json.loads(row['data']), row['source_mtime']
+
+    def put_config(self, config, source_mtime=None):
+        self.connection().execute("INSERT OR REPLACE INTO config (id, data, source_mtime) VALUES (1, ?, ?)",
+                                  (json.dumps(config, ensure_ascii=False), source_mtime))
+
+    def get_cookies(self, account):
+        row = self.connection().execute("SELECT data FROM cookies WHERE account = ?", (account,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_cookies(self, account, cookies):
+        self.connection().execute("INSERT OR REPLACE INTO cookies (account, data, updated_at) VALUES (?, ?, ?)",
+                                  (account, json.dumps(cookies), time.time()))
+
+    def delete_cookies(self, account=None):
+        if account is None:
+            self.connection().execute("DELETE FROM cookies")
+        else:
+            self.connection().execute("DELETE FROM cookies WHERE account = ?", (account,))
+
+    def get_domain_state(self):
+        rows = self.connection().execute("SELECT fqdn, value, updated_at, failures, failed_at FROM domain_state")
+        state = {}
+        for row in rows:
+            entry = {"value": row['value'], "updated_at": row['updated_at'], "failures": row['failures']}
+            if row['failed_at']:
+                entry["failed_at"] = row['failed_at']
+            state[row['fqdn']] = entry
+        return state
+
+    def put_domain_state(self, state):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO domain_state (fqdn, value, updated_at, failures, failed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(fqdn, entry.get("value"), entry.get("updated_at"), entry.get("failures", 0), entry.get("failed_at"))
+                 for fqdn, entry in state.items()])
+
+    def get_pending(self):
+        rows = self.connection().execute("SELECT fqdn, value, queued_at, attempts FROM pending_changes")
+        return {row['fqdn']: {"value": row['value'], "queued_at": row['queued_at'], "attempts": row['attempts']}
+                for row in rows}
+
+    def replace_pending(self, pending):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM pending_changes")
+            conn.executemany("INSERT INTO pending_changes (fqdn, value, queued_at, attempts) VALUES (?, ?, ?, ?)",
+                             [(fqdn, entry["value"], entry["queued_at"], entry.get("attempts", 0))
+                              for fqdn, entry in pending.items()])
+
+    def add_ip_history(self, ip, started_at, duration_seconds, updated, failed):
+        self.connection().execute(
+            "INSERT INTO ip_history (ip, started_at, duration_seconds, updated, failed) VALUES (?, ?, ?, ?, ?)",
+            (ip, started_at, duration_seconds, updated, failed))
+
+    def get_ip_history(self, limit=20):
+        rows = self.connection().execute(
+            "SELECT ip, started_at, duration_seconds, updated, failed FROM ip_history "
+            "ORDER BY started_at DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def add_browser_processes(self, processes):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO browser_processes (pid, start_time, owner_pid, owner_start_time, registered_at) "
+                "VALUES (?, ?, ?, ?, ?)", [process + (now,) for process in processes])
+
+    def remove_browser_processes(self, pids):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM browser_processes WHERE pid = ?", [(pid,) for pid in pids])
+
+    def get_browser_processes(self):
+        rows = self.connection().execute(
+            "SELECT pid, start_time, owner_pid, owner_start_time FROM browser_processes")
+        return [tuple(row) for row in rows]
+
+    def clear_session(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM cookies")
+            conn.execute("DELETE FROM domain_state")
+            conn.execute("DELETE FROM pending_changes")
+            conn.execute("DELETE FROM meta WHERE key = 'legacy_ip'")
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print(f"🟡 Предупреждение: Файл {path} поврежден или пуст.")
+            return None
@@ -0,0 +1,85 @@
+import socket
+import struct
+import threading
+import unittest
+
+import dns_check
+
+
+class StubDnsServer:
+    # Отвечает на A-запросы значениями из self.records, на остальные имена — NXDOMAIN
+
+    def __init__(self, records, ttl=60):
+        self.records = records
+        self.ttl = ttl
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.nameserver = f"127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._serve, name="stub-dns", daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(512)
+            except OSError:
+                return
+            self.queries += 1
+            self.sock.sendto(self._answer(data), address)
+
+    def _answer(self, query):
+        labels = []
+        offset = 12
+        while query[offset]:
+            labels.append(query[offset + 1:offset + 1 + query[offset]].decode())
+            offset += query[offset] + 1
+        question = query[12:offset + 5]
+        values = self.records.get(".".join(labels))
+        flags = 0x8180 if values is not None else 0x8183
+        answers = b"".join(struct.pack("!HHHIH", 0xC00C, dns_check.TYPE_A, dns_check.CLASS_IN, self.ttl, 4)
+                           + socket.inet_aton(value) for value in values or [])
+        return struct.pack("!HHHHHH", struct.unpack("!H", query[:2])[0], flags, 1, len(values or []), 0, 0) \
+            + question + answers
+
+    def close(self):
+        self.sock.close()
+
+
+class DnsCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        dns_check._cache.clear()
+        self.server = StubDnsServer({"example.test": ["192.0.2.1"], "multi.example.test": ["192.0.2.3", "192.0.2.2"]})
+        self.addCleanup(self.server.close)
+        self.config = {"dns_nameservers": [self.server.nameserver]}
+
+    def test_parse_response(self):
+        query = dns_check.build_query("example.test", 42)
+        self.assertEqual(dns_check.parse_response(self.server._answer(query), 42), (["192.0.2.1"], 60))
+        missing = dns_check.build_query("missing.test", 7)
+        self.assertEqual(dns_check.parse_response(self.server._answer(missing), 7), ([], dns_check.MAX_CACHE_SECONDS))
+        with self.assertRaises(dns_check.DnsError):
+            dns_check.parse_response(self.server._answer(query), 43)
+
+    def test_query_a_uses_cache_until_forgotten(self):
+        self.assertEqual(dns_check.query_a("multi.example.test", self.server.nameserver), ["192.0.2.2", "192.0.2.3"])
+        self.assertEqual(dns_check.query_a("Multi.Example.Test", self.server.nameserver), ["192.0.2.2", "192.0.2.3"])
+        self.assertEqual(self.server.queries, 1)
+
+        self.server.records["multi.example.test"] = ["198.51.100.7"]
+        dns_check.forget(["multi.example.test"])
+        self.assertEqual(dns_check.resolve_records(self.config, ["multi.example.test", "missing.test"]),
+                         {"multi.example.test": ["198.51.100.7"], "missing.test": []})
+
+    def test_verify_propagation(self):
+        timer = threading.Timer(0.2, self.server.records.update, [{"example.test": ["198.51.100.7"]}])
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(dns_check.verify_propagation(self.config, ["example.test"], "198.51.100.7",
+                                                      timeout=5, interval=0.1), {"example.test": True})
+        self.assertEqual(dns_check.verify_propagation(self.config, ["example.test"], "203.0.113.1",
+                                                      timeout=0.3, interval=0.1), {"example.test": False})
+
+
+if __name__ == "__main__":
+    unittest.main()
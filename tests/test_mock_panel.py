@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="timeweb-ddns-test-")
+
+import requests
+
+import dns_updater
+from http_backend import HttpBackend, SESSION_VALID, SESSION_EXPIRED, SESSION_UNKNOWN
+from mock_panel import MockPanel
+from utils import save_cookies, delete_cookies
+
+DOMAINS = ["example.test", "www.example.test"]
+NEW_IP = "198.51.100.7"
+
+
+def panel_login(panel):
+    response = requests.post(f"{panel.url}/login", allow_redirects=False, timeout=10,
+                             data={"username": panel.login, "password": panel.password})
+    return [{"name": name, "value": value, "path": "/"} for name, value in response.cookies.items()]
+
+
+class FakeBrowser:
+    # Вместо Chrome: входит в mock-панель формой и меняет записи напрямую
+    panel = None
+    launches = 0
+    updated = {}
+
+    def __init__(self, config):
+        self.config = config
+        self.logged_in = False
+        self.closed = False
+        FakeBrowser.launches += 1
+
+    def login(self):
+        save_cookies(panel_login(self.panel), self.config.get("account"))
+        self.logged_in = True
+        return True
+
+    def update_records(self, changes):
+        for fqdn, value in changes.items():
+            FakeBrowser.updated[fqdn] = value
+            self.panel.records[fqdn][0]["value"] = value
+        return dict.fromkeys(changes, True)
+
+    def get_a_records(self):
+        return {fqdn: self.panel.get_value(fqdn) or "не найдена" for fqdn in self.config["domains"]}
+
+    def close(self):
+        self.closed = True
+
+
+class MockPanelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = MockPanel(DOMAINS)
+        self.panel.start()
+        self.config = {
+            "timeweb_login": self.panel.login,
+            "timeweb_password": self.panel.password,
+            "domains": list(DOMAINS),
+            "panel_url": self.panel.url,
+            "dns_backend": "http",
+            "panel_min_interval_seconds": 0,
+        }
+        delete_cookies()
+        FakeBrowser.panel = self.panel
+        FakeBrowser.launches = 0
+        FakeBrowser.updated = {}
+        patcher = mock.patch.object(dns_updater, "TimeWebManager", FakeBrowser)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.panel.stop()
+
+    def test_login_read_update(self):
+        save_cookies(panel_login(self.panel))
+        backend = HttpBackend(self.config)
+        try:
+            self.assertTrue(backend.is_logged_in())
+            self.assertEqual(backend.get_a_records(DOMAINS), dict.fromkeys(DOMAINS, "192.0.2.1"))
+            self.assertEqual(backend.update_records(dict.fromkeys(DOMAINS, NEW_IP)), dict.fromkeys(DOMAINS, True))
+        finally:
+            backend.close()
+        self.assertEqual([self.panel.get_value(fqdn) for fqdn in DOMAINS], [NEW_IP, NEW_IP])
+
+    def test_session_state(self):
+        backend = HttpBackend(self.config)
+        try:
+            self.assertEqual(backend.session_state(), SESSION_EXPIRED)
+            save_cookies([{"name": "mock_session", "value": "expired", "path": "/"}])
+            backend.reload_cookies()
+            self.assertEqual(backend.session_state(), SESSION_EXPIRED)
+            save_cookies(panel_login(self.panel))
+            backend.reload_cookies()
+            self.assertEqual(backend.session_state(), SESSION_VALID)
+            self.panel.stop()
+            self.assertEqual(backend.session_state(), SESSION_UNKNOWN)
+        finally:
+            backend.close()
+
+    def test_stale_cookies_log_in_once(self):
+        save_cookies([{"name": "mock_session", "value": "expired", "path": "/"}])
+        results = dns_updater.update_dns_records(self.config, dict.fromkeys(DOMAINS, NEW_IP))
+        self.assertEqual(results, dict.fromkeys(DOMAINS, True))
+        self.assertEqual(FakeBrowser.launches, 1)
+        # Записи сохранены запросами, браузер понадобился только для входа
+        self.assertEqual(FakeBrowser.updated, {})
+        self.assertEqual([self.panel.get_value(fqdn) for fqdn in DOMAINS], [NEW_IP, NEW_IP])
+
+    def test_failed_http_save_reuses_browser(self):
+        config = dict(self.config, http_update_path="/domains/dns-records/unknown")
+        results = dns_updater.update_dns_records(config, dict.fromkeys(DOMAINS, NEW_IP))
+        self.assertEqual(results, dict.fromkeys(DOMAINS, True))
+        self.assertEqual(FakeBrowser.launches, 1)
+        self.assertEqual(FakeBrowser.updated, dict.fromkeys(DOMAINS, NEW_IP))
+
+    def test_missing_rows_retried_in_browser(self):
+        save_cookies(panel_login(self.panel))
+        # Таблица страницы пустая, как если бы ее заполнял скрипт
+        with mock.patch("http_backend.DnsTableParser.handle_starttag", lambda parser, tag, attrs: None):
+            records = dns_updater.get_dns_records(self.config)
+        self.assertEqual(records, dict.fromkeys(DOMAINS, "192.0.2.1"))
+        self.assertEqual(FakeBrowser.launches, 1)
+
+    def test_foreign_domains_are_not_retried_in_browser(self):
+        save_cookies(panel_login(self.panel))
+        config = dict(self.config, domains=DOMAINS + ["foreign.other"])
+        results = dns_updater.update_dns_records(config, dict.fromkeys(config["domains"], NEW_IP))
+        self.assertEqual(results, dict(dict.fromkeys(DOMAINS, True), **{"foreign.other": False}))
+        self.assertEqual(dns_updater.get_dns_records(config)["foreign.other"], "не найдена")
+        self.assertEqual(FakeBrowser.launches, 0)
+
+    def test_failed_login_does_not_start_second_browser(self):
+        with mock.patch.object(FakeBrowser, "login", lambda browser: False):
+            results = dns_updater.update_dns_records(self.config, dict.fromkeys(DOMAINS, NEW_IP))
+        self.assertEqual(results, dict.fromkeys(DOMAINS, False))
+        self.assertEqual(FakeBrowser.launches, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
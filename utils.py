@@ -1,24 +1,66 @@
 import json
+import re
 import sys
+import time
+import ipaddress
+import threading
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from getpass import getpass
 
+import metrics
+from store import Store
+
 DATA_DIR = os.getenv('DATA_DIR', 'data')
 CONFIG_FILE = os.path.join(DATA_DIR, 'config.json')
-IP_FILE = os.path.join(DATA_DIR, 'ip.txt')
-COOKIES_FILE = os.path.join(DATA_DIR, 'cookies.json')
+DB_FILE = os.path.join(DATA_DIR, 'timeweb_ddns.db')
+
+PANEL_URL = 'https://hosting.timeweb.ru'
 
 IP_SERVICES = [
     'https://api.ipify.org?format=json',
     'https://wtfismyip.com/text',
     'https://api.myip.com/'
 ]
+IP_SERVICE_TIMEOUT = 5
+
+# Суффиксы из нескольких меток, под которыми регистрируют домены (часть Public Suffix List)
+MULTI_LABEL_SUFFIXES = {
+    'com.ru', 'net.ru', 'org.ru', 'pp.ru', 'msk.ru', 'spb.ru', 'msk.su', 'spb.su',
+    'com.ua', 'kiev.ua', 'org.ua', 'net.ua', 'com.kz', 'org.kz', 'com.by', 'net.by',
+    'co.uk', 'org.uk', 'me.uk', 'co.il', 'com.tr', 'com.au', 'net.au', 'com.br',
+    'co.jp', 'com.cn', 'co.nz', 'co.za', 'com.pl',
+}
+
+_ip_session = requests.Session()
+_ip_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=len(IP_SERVICES),
+                                                            pool_maxsize=len(IP_SERVICES)))
+_ip_stats = {}
+_ip_stats_lock = threading.Lock()
+_store = Store(DB_FILE, DATA_DIR)
+_panel_requests = {}
+_panel_requests_lock = threading.Lock()
+
+def atomic_write_json(path, data, **dump_kwargs):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 
 def save_config(config):
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    # config.json остается копией для ручного редактирования, рабочая версия хранится в базе
+    atomic_write_json(CONFIG_FILE, config, indent=2, ensure_ascii=False)
+    _store.put_config(config, os.path.getmtime(CONFIG_FILE))
     print("✅ Настройки сохранены.")
 
 
@@ -39,12 +81,8 @@ def initial_setup():
     return config
 
 def clear_session():
-    if os.path.exists(IP_FILE):
-        os.remove(IP_FILE)
-        print(f"ℹ️  Файл {IP_FILE} удален.")
-    if os.path.exists(COOKIES_FILE):
-        os.remove(COOKIES_FILE)
-        print(f"ℹ️  Файл {COOKIES_FILE} удален.")
+    _store.clear_session()
+    print("ℹ️  Куки, состояние доменов и очередь изменений удалены.")
     print("✅ Сессия сброшена.")
 
 def manage_settings():
@@ -98,15 +136,22 @@ def manage_settings():
             print("Неверный ввод.")
 
 
-def load_config(setup_if_missing=True):
-    config = {}
-    if os.path.exists(CONFIG_FILE):
+def _load_stored_config():
+    config, source_mtime = _store.get_config()
+    mtime = os.path.getmtime(CONFIG_FILE) if os.path.exists(CONFIG_FILE) else None
+    # config.json правили вручную после последнего сохранения: берем файл
+    if mtime is not None and mtime != source_mtime:
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
             try:
                 config = json.load(f)
+                _store.put_config(config, mtime)
             except json.JSONDecodeError:
                 print(f"🟡 Предупреждение: Файл {CONFIG_FILE} поврежден или пуст.")
-                pass
+    return config or {}
+
+
+def load_config(setup_if_missing=True):
+    config = _load_stored_config()
 
     config['timeweb_login'] = os.getenv('TIMEWEB_LOGIN', config.get('timeweb_login'))
     config['timeweb_password'] = os.getenv('TIMEWEB_PASSWORD', config.get('timeweb_password'))
@@ -115,7 +160,13 @@ def load_config(setup_if_missing=True):
     if domains_env:
         config['domains'] = [d.strip() for d in domains_env.split(',')]
 
-    if not config.get('timeweb_login') or not config.get('timeweb_password'):
+    if config.get('accounts'):
+        missing = [account.get('name', str(i)) for i, account in enumerate(config['accounts'])
+                   if not account.get('timeweb_login') or not account.get('timeweb_password')]
+        if missing:
+            print(f"❌ Ошибка: для аккаунтов {', '.join(missing)} не указаны timeweb_login/timeweb_password.")
+            return None
+    elif not config.get('timeweb_login') or not config.get('timeweb_password'):
         if setup_if_missing and sys.stdout.isatty():
             print("Логин/пароль не найдены в config.json или переменных окружения.")
             return initial_setup()
@@ -126,36 +177,283 @@ def load_config(setup_if_missing=True):
     if 'domains' not in config: config['domains'] = []
     if 'browser' not in config: config['browser'] = 'chrome'
     if 'check_interval_minutes' not in config: config['check_interval_minutes'] = 30
+    if 'panel_url' not in config: config['panel_url'] = PANEL_URL
+    if 'dns_backend' not in config: config['dns_backend'] = 'selenium'
+    if 'ip_quorum' not in config: config['ip_quorum'] = 1
+    if 'ip_race_width' not in config: config['ip_race_width'] = 2
+    if 'offline_drivers' not in config: config['offline_drivers'] = False
+    if 'netlink_watch' not in config: config['netlink_watch'] = False
+    if 'netlink_debounce_seconds' not in config: config['netlink_debounce_seconds'] = 5
+    if 'verify_interval_minutes' not in config: config['verify_interval_minutes'] = 720
+    if 'retry_base_minutes' not in config: config['retry_base_minutes'] = 1
+    if 'retry_max_minutes' not in config: config['retry_max_minutes'] = 60
+    if 'ip_hysteresis_minutes' not in config: config['ip_hysteresis_minutes'] = 10
+    if 'max_parallel_browsers' not in config: config['max_parallel_browsers'] = 2
+    if 'metrics_textfile' not in config: config['metrics_textfile'] = True
+    if 'metrics_json_log' not in config: config['metrics_json_log'] = False
+    if 'metrics_port' not in config: config['metrics_port'] = 0
+    if 'wait_poll_seconds' not in config: config['wait_poll_seconds'] = 0.1
+    if 'lean_browser' not in config: config['lean_browser'] = False
+    if 'session_keepalive_minutes' not in config: config['session_keepalive_minutes'] = 20
+    if 'serve_port' not in config: config['serve_port'] = 8765
+    if 'serve_coalesce_seconds' not in config: config['serve_coalesce_seconds'] = 1
+    if 'serve_token' not in config: config['serve_token'] = ''
+    if 'dns_precheck' not in config: config['dns_precheck'] = True
+    if 'dns_verify_propagation' not in config: config['dns_verify_propagation'] = False
+    if 'dns_propagation_timeout_seconds' not in config: config['dns_propagation_timeout_seconds'] = 120
+    if 'change_debounce_seconds' not in config: config['change_debounce_seconds'] = 60
+    if 'panel_min_interval_seconds' not in config: config['panel_min_interval_seconds'] = 0.5
+    if 'browser_operation_timeout_seconds' not in config: config['browser_operation_timeout_seconds'] = 180
+    if 'browser_memory_limit_mb' not in config: config['browser_memory_limit_mb'] = 1024
+    if 'diagnostics_max_bundles' not in config: config['diagnostics_max_bundles'] = 20
+    if 'diagnostics_max_mb' not in config: config['diagnostics_max_mb'] = 20
+    if 'diagnostics_retention_days' not in config: config['diagnostics_retention_days'] = 14
+    if 'zone_index_ttl_minutes' not in config: config['zone_index_ttl_minutes'] = 1440
+    if 'browser_tabs' not in config: config['browser_tabs'] = 1
+    if 'keep_browser_session' not in config: config['keep_browser_session'] = False
+    if 'session_max_uses' not in config: config['session_max_uses'] = 20
+    if 'session_max_age_minutes' not in config: config['session_max_age_minutes'] = 360
 
+    metrics.configure(config, DATA_DIR)
     return config
 
 
-def get_current_ip():
-    for service_url in IP_SERVICES:
+def parse_ip(text, version=4):
+    try:
+        ip = ipaddress.ip_address(text.strip())
+    except ValueError:
+        return None
+    if version and ip.version != version:
+        return None
+    return str(ip)
+
+
+def _record_ip_stat(service_url, latency, ok):
+    with _ip_stats_lock:
+        stats = _ip_stats.setdefault(service_url, {"ok": 0, "failed": 0, "latency": None, "failure_rate": 0.0})
+        stats["ok" if ok else "failed"] += 1
+        stats["latency"] = latency if stats["latency"] is None else 0.7 * stats["latency"] + 0.3 * latency
+        stats["failure_rate"] = 0.7 * stats["failure_rate"] + 0.3 * (0.0 if ok else 1.0)
+
+
+def get_ip_service_stats():
+    with _ip_stats_lock:
+        return {url: dict(stats) for url, stats in _ip_stats.items()}
+
+
+def _ranked_ip_services():
+    def score(service_url):
+        stats = _ip_stats.get(service_url)
+        if not stats:
+            return 0.0
+        return stats["latency"] + stats["failure_rate"] * IP_SERVICE_TIMEOUT
+
+    with _ip_stats_lock:
+        return sorted(IP_SERVICES, key=score)
+
+
+def _query_ip_service(service_url):
+    started = time.monotonic()
+    ip = None
+    try:
+        response = _ip_session.get(service_url, timeout=IP_SERVICE_TIMEOUT)
+        response.raise_for_status()
         try:
-            response = requests.get(service_url, timeout=5)
-            response.raise_for_status()
+            ip = parse_ip(response.json()['ip'])
+        except (ValueError, KeyError, TypeError):
+            ip = parse_ip(response.text)
+        if not ip:
+            print(f"🟡  Сервис {service_url} вернул некорректный ответ.")
+    except requests.RequestException:
+        print(f"🟡  Сервис {service_url} недоступен.")
+    elapsed = time.monotonic() - started
+    _record_ip_stat(service_url, elapsed, ip is not None)
+    metrics.observe("ip_lookup", elapsed, ip is not None, service=service_url)
+    return ip
 
-            if 'ipify' in service_url:
-                return response.json()['ip']
-            else:
-                return response.text.strip()
 
-        except requests.RequestException as e:
-            print(f"🟡  Сервис {service_url} недоступен, пробую следующий...")
-            continue
+def get_current_ip(quorum=1, race_width=2):
+    services = _ranked_ip_services()
+    quorum = max(1, min(quorum, len(services)))
+    race_width = max(race_width, quorum)
+    votes = {}
 
-    print("❌ Не удалось получить внешний IP ни от одного из сервисов.")
-    return None
+    executor = ThreadPoolExecutor(max_workers=len(services))
+    try:
+        pending = set()
+        while services or pending:
+            while services and len(pending) < race_width:
+                pending.add(executor.submit(_query_ip_service, services.pop(0)))
 
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ip = future.result()
+                if not ip:
+                    continue
+                votes[ip] = votes.get(ip, 0) + 1
+                if votes[ip] >= quorum:
+                    return ip
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-def get_saved_ip():
-    if os.path.exists(IP_FILE):
-        with open(IP_FILE, 'r') as f:
-            return f.read().strip()
+    if votes:
+        print(f"❌ Сервисы вернули разные IP ({', '.join(votes)}), кворум {quorum} не набран.")
+    else:
+        print("❌ Не удалось получить внешний IP ни от одного из сервисов.")
     return None
 
 
-def save_new_ip(ip):
-    with open(IP_FILE, 'w') as f:
-        f.write(ip)
\ No newline at end of file
+def load_domain_state(domains=()):
+    state = _store.get_domain_state()
+    if state or not domains:
+        return state
+
+    with _store.transaction():
+        state = _store.get_domain_state()
+        # ip.txt сохранялся только после успешного обновления всех доменов
+        legacy_ip = _store.get_meta('legacy_ip')
+        if legacy_ip and not state:
+            state = {fqdn: {"value": legacy_ip, "updated_at": None, "failures": 0} for fqdn in domains}
+            _store.put_domain_state(state)
+            _store.delete_meta('legacy_ip')
+    return state
+
+
+def update_domain_state(update):
+    # Чтение и запись в одной транзакции: снимок состояния не затрет результаты другого процесса
+    with _store.transaction():
+        state = _store.get_domain_state()
+        result = update(state)
+        _store.put_domain_state(state)
+    return result
+
+
+def get_confirmed_value(state, fqdn):
+    return state.get(fqdn, {}).get("value")
+
+
+def record_domain_results(state, results, value):
+    now = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    for fqdn, ok in results.items():
+        entry = state.setdefault(fqdn, {"value": None, "updated_at": None, "failures": 0})
+        if ok:
+            entry.update(value=value, updated_at=now, failures=0)
+        else:
+            entry["failures"] = entry.get("failures", 0) + 1
+            entry["failed_at"] = now
+    return state
+
+
+def load_pending_changes():
+    return _store.get_pending()
+
+
+def update_pending_changes(update):
+    with _store.transaction():
+        pending = _store.get_pending()
+        result = update(pending)
+        _store.replace_pending(pending)
+    return result
+
+
+def record_ip_change(ip, started_at, duration_seconds, updated, failed):
+    _store.add_ip_history(ip, started_at, duration_seconds, updated, failed)
+
+
+def get_ip_history(limit=20):
+    return _store.get_ip_history(limit)
+
+
+def register_browser_processes(processes):
+    _store.add_browser_processes(processes)
+
+
+def unregister_browser_processes(pids):
+    _store.remove_browser_processes(pids)
+
+
+def load_browser_processes():
+    return _store.get_browser_processes()
+
+
+def _zone_index_key(account):
+    return f"zone_index:{cookies_key(account)}"
+
+
+def load_zone_index(account=None):
+    value = _store.get_meta(_zone_index_key(account))
+    return json.loads(value) if value else None
+
+
+def save_zone_index(index, account=None):
+    _store.put_meta(_zone_index_key(account), json.dumps(index, ensure_ascii=False))
+
+
+def throttle_panel(panel_url, min_interval):
+    if min_interval <= 0:
+        return
+    # Общий для всех потоков интервал между запросами к одной панели
+    with _panel_requests_lock:
+        now = time.monotonic()
+        scheduled = max(now, _panel_requests.get(panel_url, 0) + min_interval)
+        _panel_requests[panel_url] = scheduled
+    if scheduled > now:
+        time.sleep(scheduled - now)
+
+
+def get_accounts(config):
+    if not config.get('accounts'):
+        return [config]
+
+    accounts = []
+    for account in config['accounts']:
+        merged = {key: value for key, value in config.items() if key != 'accounts'}
+        merged.update(account)
+        merged['account'] = account.get('name') or account['timeweb_login']
+        merged['domains'] = list(account.get('domains', []))
+        accounts.append(merged)
+    return accounts
+
+
+def get_all_domains(config):
+    return [fqdn for account in get_accounts(config) for fqdn in account['domains']]
+
+
+def cookies_key(account=None):
+    if not account:
+        return ''
+    return re.sub(r'[^\w.-]', '_', account)
+
+
+def load_cookies(account=None):
+    return _store.get_cookies(cookies_key(account))
+
+
+def save_cookies(cookies, account=None):
+    _store.put_cookies(cookies_key(account), cookies)
+
+
+def delete_cookies(account=None):
+    _store.delete_cookies(cookies_key(account))
+
+
+def registrable_zone(fqdn):
+    labels = fqdn.lower().rstrip('.').split('.')
+    size = 3 if len(labels) > 2 and '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 2
+    return '.'.join(labels[-size:])
+
+
+def dns_page_url(fqdn, panel_url=PANEL_URL, zone=None):
+    fqdn = fqdn.lower().rstrip('.')
+    zone = zone or registrable_zone(fqdn)
+    if fqdn != zone:
+        subdomain = fqdn[:-len(zone) - 1]
+        return f"{panel_url}/domains/dns-records/subdomain?fqdn={zone}&sub={subdomain}"
+    return f"{panel_url}/domains/dns-records/domain?fqdn={fqdn}"
+
+
+def find_a_record(rows, fqdn):
+    for row in rows:
+        if row["name"] == fqdn and row["type"] == "A":
+            return row
+    return None
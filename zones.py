@@ -0,0 +1,114 @@
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlparse, parse_qs
+
+from utils import dns_page_url, load_zone_index, save_zone_index
+
+DNS_RECORDS_PATH = "/domains/dns-records/"
+# Домен не нашелся в индексе: перечитываем список, если индекс старше этого
+REFRESH_ON_MISS_SECONDS = 60
+# Список не удалось прочитать: столько времени не пробуем снова и строим адреса по именам
+FAILED_LISTING_RETRY_SECONDS = 600
+
+
+class ZoneListingParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.zones = set()
+        self.pages = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        href = dict(attrs).get("href") or ""
+        url = urlparse(href)
+        if not url.path.startswith(DNS_RECORDS_PATH):
+            return
+        query = parse_qs(url.query)
+        zone = query.get("fqdn", [""])[0].lower()
+        if not zone:
+            return
+        sub = query.get("sub", [""])[0].lower()
+        self.zones.add(zone)
+        self.pages[f"{sub}.{zone}" if sub else zone] = f"{url.path}?{url.query}"
+
+
+def parse_listing(html):
+    parser = ZoneListingParser()
+    parser.feed(html)
+    return {"fetched_at": time.time(), "zones": sorted(parser.zones), "pages": parser.pages}
+
+
+def get_index(config, fetch_listing, force=False):
+    account = config.get("account")
+    index = None if force else load_zone_index(account)
+    if index and _is_fresh(config, index):
+        return index
+
+    try:
+        html = fetch_listing()
+    except Exception as e:
+        print(f"  - 🟡 Не удалось получить список доменов аккаунта: {e}")
+        return _save_failed(index, account)
+    fresh = parse_listing(html) if html else None
+    if not fresh or not fresh["zones"]:
+        print("  - 🟡 Список доменов аккаунта не распознан, страницы DNS определяю по именам.")
+        return _save_failed(index, account)
+    save_zone_index(fresh, account)
+    print(f"  - ℹ️  Доменов в аккаунте: {len(fresh['zones'])}, страниц DNS: {len(fresh['pages'])}.")
+    return fresh
+
+
+def _is_fresh(config, index):
+    now = time.time()
+    if now - index.get("failed_at", 0) < FAILED_LISTING_RETRY_SECONDS:
+        return True
+    return now - index["fetched_at"] < config.get("zone_index_ttl_minutes", 1440) * 60
+
+
+def _save_failed(index, account):
+    # Запоминаем и неудачу, иначе каждый вызов снова ждал бы загрузки /domains
+    index = dict(index or {"fetched_at": 0, "zones": [], "pages": {}}, failed_at=time.time())
+    save_zone_index(index, account)
+    return index
+
+
+def find_zone(index, fqdn):
+    matches = [zone for zone in index["zones"] if fqdn == zone or fqdn.endswith(f".{zone}")]
+    return max(matches, key=len) if matches else None
+
+
+def page_url(index, fqdn, panel_url):
+    fqdn = fqdn.lower().rstrip('.')
+    if not index or not index["zones"]:
+        return dns_page_url(fqdn, panel_url)
+    if fqdn in index["pages"]:
+        return f"{panel_url}{index['pages'][fqdn]}"
+    zone = find_zone(index, fqdn)
+    return dns_page_url(fqdn, panel_url, zone=zone) if zone else None
+
+
+def group_by_page(index, domains, panel_url):
+    pages = {}
+    rejected = []
+    for fqdn in domains:
+        url = page_url(index, fqdn, panel_url)
+        if url:
+            pages.setdefault(url, []).append(fqdn)
+        else:
+            rejected.append(fqdn)
+    return pages, rejected
+
+
+def resolve_pages(config, domains, panel_url, fetch_listing):
+    index = get_index(config, fetch_listing)
+    pages, rejected = group_by_page(index, domains, panel_url)
+    if rejected and time.time() - max(index["fetched_at"], index.get("failed_at", 0)) > REFRESH_ON_MISS_SECONDS:
+        index = get_index(config, fetch_listing, force=True)
+        pages, rejected = group_by_page(index, domains, panel_url)
+
+    for fqdn in rejected:
+        print(f"  - ❌ {fqdn}: домена нет в аккаунте ({', '.join(index['zones'])}). "
+              f"Проверьте список доменов в настройках.")
+    return pages, rejected